@@ -0,0 +1,300 @@
+import sys
+import os
+import io
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+from dataclasses import replace
+
+import PIL
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from watermark_spec import WatermarkSpec
+from watermark_renderer import render_watermark
+from export_engine import ExportOptions, has_alpha, resize_for_export, export_size, load_resized
+from font_resolver import resolve_font_path
+
+# 水印流水线性能测试：生成不同尺寸、模式和格式的合成图片，按导出流程
+# （解码 → 添加水印 → 调整尺寸 → 编码）分阶段计时，结果输出为JSON，便于在不同提交之间比较
+# 用法示例：
+#   python benchmarks/bench_pipeline.py run --output before.json
+#   python benchmarks/bench_pipeline.py run --sizes 1,12,24,50,100 --formats JPEG --output after.json
+#   python benchmarks/bench_pipeline.py compare before.json after.json
+
+DEFAULT_SIZES = (1, 12, 24)  # 百万像素
+DEFAULT_MODES = ('RGB', 'RGBA', 'L', 'CMYK')
+DEFAULT_FORMATS = ('JPEG', 'PNG', 'TIFF')
+DEFAULT_CONFIGS = ('text', 'stroke', 'shadow', 'image')
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+FORMAT_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'TIFF': '.tif'}
+# 各格式不支持的模式
+UNSUPPORTED = {('JPEG', 'RGBA'), ('PNG', 'CMYK')}
+
+STAGES = ('decode', 'watermark', 'resize', 'encode')
+
+
+def synthetic_image(megapixels, mode):
+    # 渐变叠加高斯噪声，压缩率接近真实照片；宽高比3:2
+    width = int((megapixels * 1_000_000 * 3 / 2) ** 0.5)
+    height = int(width * 2 / 3)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    bands = []
+    for index in range(len(Image.new(mode, (1, 1)).getbands())):
+        noise = Image.effect_noise((width, height), 24 + index * 8)
+        bands.append(Image.blend(gradient.rotate(90 * index, expand=False), noise, 0.35))
+    if mode == 'RGBA':
+        # 透明度保持较高，避免大面积全透明
+        bands[3] = bands[3].point(lambda p: 128 + p // 2)
+    return Image.merge(mode, bands) if len(bands) > 1 else bands[0]
+
+
+def input_path(data_dir, megapixels, mode, image_format):
+    return os.path.join(data_dir, f"synthetic_{megapixels}mp_{mode.lower()}{FORMAT_EXTENSIONS[image_format]}")
+
+
+def ensure_inputs(data_dir, sizes, modes, formats):
+    # 生成测试图片，已存在时直接复用；返回 [(百万像素, 模式, 格式, 路径)]
+    os.makedirs(data_dir, exist_ok=True)
+    inputs = []
+    for megapixels in sizes:
+        for mode in modes:
+            img = None
+            for image_format in formats:
+                if (image_format, mode) in UNSUPPORTED:
+                    continue
+                path = input_path(data_dir, megapixels, mode, image_format)
+                if not os.path.exists(path):
+                    if img is None:
+                        img = synthetic_image(megapixels, mode)
+                    img.save(path, image_format, **({'quality': 90} if image_format == 'JPEG' else {}))
+                inputs.append((megapixels, mode, image_format, path))
+    return inputs
+
+
+def ensure_logo(data_dir):
+    path = os.path.join(data_dir, 'logo.png')
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        logo = Image.new('RGBA', (600, 300), (0, 0, 0, 0))
+        logo.paste(synthetic_image(0.18, 'RGB').resize((500, 250)), (50, 25))
+        logo.save(path)
+    return path
+
+
+def make_spec(config, image_size, logo_path):
+    # 水印大小与图片尺寸成比例，与实际使用时一致
+    width, height = image_size
+    base = WatermarkSpec(text="PhotoWatermark 2024", font_size=max(24, width // 25), anchor=(0.1, 0.8))
+    if config == 'text':
+        return base
+    if config == 'stroke':
+        return replace(base, stroke_enabled=True, stroke_width=max(1, width // 1000))
+    if config == 'shadow':
+        return replace(base, shadow_enabled=True, shadow_distance=max(2, width // 800))
+    if config == 'tiled':
+        return replace(base, tiled=True, tile_spacing=width // 20, tile_angle=30)
+    if config == 'image':
+        logo_width = width // 4
+        return replace(base, watermark_type='image', image_path=logo_path,
+                       image_size=(logo_width, logo_width // 2), image_transparency=30)
+    raise ValueError(f"未知的水印配置: {config}")
+
+
+def run_pipeline(path, spec, options):
+    # 与 export_engine.export_image 相同的处理流程，分阶段计时；编码写入内存，不计磁盘速度
+    timings = {}
+    start = time.perf_counter()
+    img = Image.open(path)
+    source = img
+    size = export_size(img.size, options) if options.resize_first else None
+    if size is not None:
+        # 先缩放再加水印：缩小解码和缩放计入解码阶段，调整尺寸阶段为0
+        spec = spec.scaled(size[0] / img.width)
+        img = load_resized(img, size)
+    else:
+        img.load()
+    timings['decode'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if options.output_format == "JPEG" and not has_alpha(img):
+        watermarked = render_watermark(img, spec, mode='RGB', copy=False)
+    else:
+        watermarked = render_watermark(img, spec, copy=False)
+    timings['watermark'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if size is None:
+        watermarked = resize_for_export(watermarked, options)
+    timings['resize'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    output = io.BytesIO()
+    if options.output_format == "JPEG":
+        if watermarked.mode == 'RGBA':
+            watermarked = watermarked.convert('RGB')
+        watermarked.save(output, 'JPEG', quality=options.quality)
+    else:
+        watermarked.save(output, options.output_format)
+    timings['encode'] = time.perf_counter() - start
+
+    source.close()
+    return timings, output.tell()
+
+
+def summarize(samples):
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.mean(samples),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(args):
+    sizes = [int(size) for size in args.sizes.split(',')]
+    modes = args.modes.split(',')
+    formats = args.formats.split(',')
+    configs = args.configs.split(',')
+
+    inputs = ensure_inputs(args.data_dir, sizes, modes, formats)
+    logo_path = ensure_logo(args.data_dir)
+    options = ExportOptions(output_folder="", output_format=args.output_format,
+                            resize_method="按百分比" if args.resize_percent != 100 else "原始尺寸",
+                            percent=args.resize_percent, resize_first=args.resize_first)
+
+    results = []
+    for megapixels, mode, image_format, path in inputs:
+        with Image.open(path) as img:
+            image_size = img.size
+        for config in configs:
+            spec = make_spec(config, image_size, logo_path)
+            # 预热：字体索引、文本图层和图片水印的缓存不计入测量
+            run_pipeline(path, spec, options)
+            stage_samples = {stage: [] for stage in STAGES}
+            total_samples = []
+            output_bytes = 0
+            for _ in range(args.repeat):
+                timings, output_bytes = run_pipeline(path, spec, options)
+                for stage in STAGES:
+                    stage_samples[stage].append(timings[stage])
+                total_samples.append(sum(timings.values()))
+
+            result = {
+                'megapixels': megapixels,
+                'size': list(image_size),
+                'mode': mode,
+                'input_format': image_format,
+                'input_bytes': os.path.getsize(path),
+                'config': config,
+                'output_bytes': output_bytes,
+                'stages': {stage: summarize(samples) for stage, samples in stage_samples.items()},
+                'total': summarize(total_samples),
+            }
+            results.append(result)
+            if not args.quiet:
+                stages = "  ".join(f"{stage} {result['stages'][stage]['median'] * 1000:8.1f}" for stage in STAGES)
+                print(f"{megapixels:>4}MP {mode:<4} {image_format:<4} {config:<6} {stages}  "
+                      f"total {result['total']['median'] * 1000:8.1f} ms", file=sys.stderr)
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        # 找不到指定字体时使用PIL默认字体，文本水印的耗时不可比
+        'font': resolve_font_path(WatermarkSpec().font_family),
+        'repeat': args.repeat,
+        'output_format': args.output_format,
+        'resize_percent': args.resize_percent,
+        'resize_first': args.resize_first,
+        'results': results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+def case_key(result):
+    return (result['megapixels'], result['mode'], result['input_format'], result['config'])
+
+
+def compare_reports(args):
+    # 按相同的测试用例比较两次结果的中位数耗时，比值小于1表示变快
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+
+    baseline_results = {case_key(result): result for result in baseline['results']}
+    print(f"基准 {baseline.get('revision')}  当前 {current.get('revision')}")
+    for result in current['results']:
+        old = baseline_results.get(case_key(result))
+        if old is None:
+            continue
+        ratios = "  ".join(
+            f"{stage} {result['stages'][stage]['median'] / old['stages'][stage]['median']:5.2f}x"
+            if old['stages'][stage]['median'] > 0 else f"{stage}   n/a"
+            for stage in STAGES
+        )
+        total_ratio = result['total']['median'] / old['total']['median']
+        megapixels, mode, image_format, config = case_key(result)
+        print(f"{megapixels:>4}MP {mode:<4} {image_format:<4} {config:<6} {ratios}  total {total_ratio:5.2f}x")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="水印流水线性能测试")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser("run", help="运行性能测试并输出JSON结果")
+    run_parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                            help="图片尺寸（百万像素），逗号分隔，例如 1,12,24,50,100")
+    run_parser.add_argument("--modes", default=",".join(DEFAULT_MODES), help="图片模式，逗号分隔")
+    run_parser.add_argument("--formats", default=",".join(DEFAULT_FORMATS), help="输入格式，逗号分隔")
+    run_parser.add_argument("--configs", default=",".join(DEFAULT_CONFIGS),
+                            help="水印配置，逗号分隔；另有 tiled（平铺文本水印）")
+    run_parser.add_argument("--output-format", default="JPEG", choices=("JPEG", "PNG"), help="导出格式")
+    run_parser.add_argument("--resize-percent", type=int, default=100, help="导出时按百分比缩放，100为不缩放")
+    run_parser.add_argument("--resize-first", action="store_true", help="先缩放再添加水印（与导出设置相同）")
+    run_parser.add_argument("--repeat", type=int, default=3, help="每个用例的重复次数")
+    run_parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="合成图片的保存位置")
+    run_parser.add_argument("-o", "--output", help="结果JSON文件，默认输出到标准输出")
+    run_parser.add_argument("-q", "--quiet", action="store_true", help="不输出每个用例的耗时")
+    run_parser.set_defaults(func=run_benchmarks)
+
+    compare_parser = subparsers.add_parser("compare", help="比较两次测试结果")
+    compare_parser.add_argument("baseline", help="基准结果JSON")
+    compare_parser.add_argument("current", help="当前结果JSON")
+    compare_parser.set_defaults(func=compare_reports)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import sys
+import os
+import glob
+import argparse
+from dataclasses import replace
+
+from folder_scanner import scan_folder
+from image_registry import path_key
+
+# 命令行批处理入口：不导入PyQt5，可以在没有显示器的服务器上运行
+# 用法示例：
+#   python src/cli.py batch "photos/*.jpg" --template 我的模板 --output out --workers 8
+
+
+def expand_inputs(inputs):
+    # 展开文件路径、通配符和文件夹，保持输入顺序并去重
+    file_paths = []
+    seen = set()
+    for pattern in inputs:
+        matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        for match in matches:
+            if os.path.isdir(match):
+                candidates = scan_folder(match)
+            else:
+                candidates = [match]
+
+            for path in candidates:
+                key = path_key(path)
+                if key not in seen:
+                    seen.add(key)
+                    file_paths.append(path)
+    return file_paths
+
+
+def run_batch(args):
+    from export_engine import ExportJob
+    from watermark_template import load_template_file, spec_from_template, export_options_from_template
+
+    file_paths = expand_inputs(args.inputs)
+    if not file_paths:
+        print("错误：没有找到需要处理的图片", file=sys.stderr)
+        return 2
+
+    try:
+        template = load_template_file(args.template)
+    except Exception as e:
+        print(f"错误：无法加载模板 {args.template}: {str(e)}", file=sys.stderr)
+        return 2
+
+    # 与图形界面一致，禁止导出到原文件夹
+    output_folder = os.path.abspath(args.output)
+    original_folders = {os.path.dirname(os.path.abspath(path)) for path in file_paths}
+    if output_folder in original_folders:
+        print("错误：为防止覆盖原图，禁止导出到原文件夹", file=sys.stderr)
+        return 2
+
+    # 模板中的水印图片不存在、颜色或字号格式错误等同样按模板错误处理
+    try:
+        spec = spec_from_template(template)
+        options = export_options_from_template(template, output_folder)
+    except Exception as e:
+        print(f"错误：模板 {args.template} 无效: {str(e)}", file=sys.stderr)
+        return 2
+    if args.resize_first:
+        options = replace(options, resize_first=True)
+    job = ExportJob(file_paths, spec, options, args.workers)
+
+    try:
+        for source_path, output_path, error in job.run():
+            if error is not None:
+                print(f"[{job.completed}/{job.total}] 无法导出文件 {source_path}: {str(error)}", file=sys.stderr)
+            elif not args.quiet:
+                print(f"[{job.completed}/{job.total}] {source_path} -> {output_path}")
+    except KeyboardInterrupt:
+        # 已写出的文件都是完整的，未完成的图片不会留下临时文件
+        print(f"已取消：{job.summary()}", file=sys.stderr)
+        return 130
+
+    print(f"完成：{job.summary()}")
+    return 1 if job.errors else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="photowatermark", description="图片水印工具命令行批处理")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    batch_parser = subparsers.add_parser("batch", help="使用已保存的模板批量添加水印并导出")
+    batch_parser.add_argument("inputs", nargs="+", help="图片文件、通配符或文件夹")
+    batch_parser.add_argument("-t", "--template", required=True, help="模板文件路径，或templates目录中的模板名称")
+    batch_parser.add_argument("-o", "--output", required=True, help="输出文件夹")
+    batch_parser.add_argument("-j", "--workers", type=int, default=None, help="并行进程数，默认为CPU核心数")
+    batch_parser.add_argument("-q", "--quiet", action="store_true", help="只输出错误和汇总信息")
+    batch_parser.add_argument("--resize-first", action="store_true",
+                              help="先缩放图片再按相同比例添加水印，缩小导出大图时更快（覆盖模板设置）")
+    batch_parser.add_argument("--log-level", help="日志级别，例如 DEBUG、INFO")
+    batch_parser.add_argument("--trace", metavar="FILE", help="记录各阶段耗时，写出Chrome trace格式的JSON文件")
+    batch_parser.add_argument("--profile", metavar="FILE",
+                              help="写出cProfile统计（扩展名为.txt时为文本报告）；只统计主进程，建议配合 -j 1 使用")
+    batch_parser.set_defaults(func=run_batch)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    import tracing
+    tracing.configure(args.log_level, args.trace, args.profile)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
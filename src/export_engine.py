@@ -0,0 +1,421 @@
+import io
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from PIL import Image, UnidentifiedImageError
+
+from watermark_renderer import render_watermark, has_alpha
+from tracing import span, is_tracing, run_traced, add_events
+
+
+@dataclass(frozen=True)
+class ExportOptions:
+    output_folder: str
+    output_format: str = "JPEG"  # JPEG 或 PNG
+    quality: int = 90
+    resize_method: str = "原始尺寸"  # 原始尺寸 / 按宽度 / 按高度 / 按百分比
+    width: str = ""
+    height: str = ""
+    percent: int = 100
+    preserve_filename: bool = True
+    prefix: str = ""
+    suffix: str = ""
+    # 先缩放原图再按缩放后的尺寸绘制水印：缩小导出时按目标尺寸缩小解码，不再合成随后被丢弃的像素；
+    # 水印的几何尺寸按同一比例缩放，输出与先加水印再缩放基本一致，但不保证逐像素相同
+    resize_first: bool = False
+
+
+def default_worker_count():
+    return os.cpu_count() or 1
+
+
+def build_output_filename(source_path, options):
+    original_filename = os.path.basename(source_path)
+    base_name, ext = os.path.splitext(original_filename)
+
+    if options.preserve_filename:
+        return original_filename
+    return f"{options.prefix}{base_name}{options.suffix}.{options.output_format.lower()}"
+
+
+def export_size(size, options):
+    # 按导出设置计算目标尺寸，不调整尺寸或输入无效时返回None
+    width, height = size
+
+    if options.resize_method == "按宽度":
+        try:
+            new_width = int(options.width)
+        except ValueError:
+            return None
+        # 保持宽高比
+        scale = new_width / width
+        return new_width, int(height * scale)
+    elif options.resize_method == "按高度":
+        try:
+            new_height = int(options.height)
+        except ValueError:
+            return None
+        scale = new_height / height
+        return int(width * scale), new_height
+    elif options.resize_method == "按百分比":
+        scale = options.percent / 100
+        return int(width * scale), int(height * scale)
+
+    return None
+
+
+def resize_for_export(img, options):
+    # 调整图片尺寸，输入无效时跳过尺寸调整
+    size = export_size(img.size, options)
+    if size is None:
+        return img
+    return img.resize(size, Image.LANCZOS)
+
+
+# 缩小时先用 reduce 按整数倍快速降采样到目标尺寸的这个倍数以上，再用LANCZOS精确缩放
+RESIZE_REDUCING_GAP = 3.0
+
+
+def load_resized(img, size):
+    # 先缩放再加水印时的解码：JPEG用 draft 按1/2~1/8直接缩小解码（解码结果不小于目标尺寸），
+    # 其他格式完整解码后由 reducing_gap 先按整数倍降采样；返回目标尺寸的图片
+    if size[0] < img.width and size[1] < img.height:
+        img.draft(img.mode, size)
+    img.load()
+    if img.size == size:
+        return img
+    return img.resize(size, Image.LANCZOS, reducing_gap=RESIZE_REDUCING_GAP)
+
+
+def read_source(source_path):
+    # 读取阶段：把整个源文件读入内存，解码时不再访问磁盘
+    with span("read", path=source_path), open(source_path, 'rb') as f:
+        return f.read()
+
+
+def output_path_for(source_path, options):
+    return os.path.join(options.output_folder, build_output_filename(source_path, options))
+
+
+def render_image(source_path, data, spec, options):
+    # 处理阶段：解码 → 添加水印 → 调整尺寸 → 编码，返回编码后的文件内容，不访问磁盘
+    # 串行导出和进程池中的并行导出都调用这个函数，保证输出结果完全一致
+    # data 为None时直接从 source_path 读取
+    # 从内存解码时Pillow的错误信息中只有BytesIO对象，改为报告源文件路径
+    try:
+        img = Image.open(io.BytesIO(data) if data is not None else source_path)
+    except UnidentifiedImageError:
+        raise UnidentifiedImageError(f"cannot identify image file {source_path!r}") from None
+    with img:
+        size = export_size(img.size, options) if options.resize_first else None
+        if size is not None:
+            # 先缩放再加水印：水印按缩放比例绘制，只合成输出图片的像素
+            source_width = img.width
+            with span("decode", path=source_path, resize_first=True):
+                resized = load_resized(img, size)
+            spec = spec.scaled(size[0] / source_width)
+            img = resized
+        else:
+            with span("decode", path=source_path):
+                img.load()
+        # 导出JPEG且原图没有透明度时直接以RGB合成，只有水印区域需要转换为RGBA
+        with span("watermark"):
+            if options.output_format == "JPEG" and not has_alpha(img):
+                watermarked_img = render_watermark(img, spec, mode='RGB', copy=False)
+            else:
+                watermarked_img = render_watermark(img, spec, copy=False)
+    if size is None:
+        with span("resize"):
+            watermarked_img = resize_for_export(watermarked_img, options)
+
+    # 保存格式由输出文件的扩展名决定（保留原始文件名时与原图格式相同）
+    ext = os.path.splitext(build_output_filename(source_path, options))[1].lower()
+    save_format = Image.registered_extensions().get(ext)
+    if save_format is None:
+        raise ValueError(f"unknown file extension: {ext}")
+    output = io.BytesIO()
+    with span("encode", format=options.output_format):
+        if options.output_format == "JPEG":
+            if watermarked_img.mode == 'RGBA':
+                watermarked_img = watermarked_img.convert('RGB')
+            watermarked_img.save(output, save_format, quality=options.quality)
+        else:
+            watermarked_img.save(output, save_format)
+    return output.getvalue()
+
+
+def write_output(output_path, data):
+    # 写入阶段：先写入同一文件夹中的临时文件，完成后再替换为目标文件；
+    # 导出失败或被中断时不会留下不完整的输出文件
+    folder = os.path.dirname(output_path)
+    base_name, ext = os.path.splitext(os.path.basename(output_path))
+    temp_path = os.path.join(folder, f".{base_name}.{os.getpid()}.{threading.get_ident()}.tmp{ext}")
+    try:
+        with span("write", path=output_path):
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return output_path
+
+
+def export_image(source_path, spec, options):
+    # 单张图片的完整导出流程：读取 → 处理 → 写入
+    output_path = output_path_for(source_path, options)
+    return write_output(output_path, render_image(source_path, read_source(source_path), spec, options))
+
+
+# 读取源文件的线程数：磁盘较慢（机械硬盘、网络共享）时提前读取后面的图片，处理进程不必等待磁盘
+READER_THREADS = 2
+# 每个处理进程最多对应的在途图片数（已读取、正在处理或等待写入），决定流水线占用的内存上限
+IN_FLIGHT_PER_WORKER = 2
+
+# 队列结束标记
+_DONE = object()
+
+
+class ExportEngine:
+    # 导出引擎：读取、处理、写入三个阶段组成流水线，阶段之间用有界队列连接，
+    # 磁盘读写和图片处理同时进行；下游来不及处理时上游自动等待，内存占用不随图片数量增长
+    # - 读取：READER_THREADS 个线程把源文件读入内存
+    # - 处理：max_workers 为 1 时在当前进程的一个线程中处理，否则使用进程池
+    # - 写入：一个线程按完成顺序写出文件
+
+    def __init__(self, max_workers=None, reader_threads=READER_THREADS):
+        self.max_workers = max(1, max_workers or default_worker_count())
+        self.reader_threads = max(1, reader_threads)
+
+    def _executor(self, workers):
+        if workers == 1:
+            return ThreadPoolExecutor(max_workers=1)
+        # 使用spawn启动子进程，避免fork带有Qt状态的GUI进程
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def run(self, source_paths, spec, options, cancel_event=None):
+        # 逐个产出 (源文件路径, 输出路径, 异常)，完成顺序不保证与输入顺序一致
+        # cancel_event：threading.Event，设置后不再读取和开始新的图片，正在处理的图片完成后结束
+        os.makedirs(options.output_folder, exist_ok=True)
+        if not source_paths:
+            return
+
+        # 调用方提前结束（例如在命令行中按Ctrl+C）时同样停止
+        stop_event = threading.Event()
+
+        def stopped():
+            return stop_event.is_set() or (cancel_event is not None and cancel_event.is_set())
+
+        workers = min(self.max_workers, len(source_paths))
+        in_flight = workers * IN_FLIGHT_PER_WORKER
+        # 开启跟踪时子进程记录的事件随结果一起返回，合并到主进程的跟踪数据中
+        traced = is_tracing() and workers > 1
+
+        path_queue = queue.Queue()
+        for source_path in source_paths:
+            path_queue.put(source_path)
+        read_queue = queue.Queue(maxsize=in_flight)  # (源文件路径, 文件内容, 异常)
+        write_queue = queue.Queue()  # (源文件路径, Future或异常)，长度受 slots 限制
+        result_queue = queue.Queue()  # (源文件路径, 输出路径, 异常)
+        slots = threading.Semaphore(in_flight)
+        # 已提交但还没有写出的任务，取消时其中尚未开始的任务直接取消
+        pending = set()
+
+        def read_stage():
+            while not stopped():
+                try:
+                    source_path = path_queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    item = (source_path, read_source(source_path), None)
+                except Exception as e:
+                    item = (source_path, None, e)
+                read_queue.put(item)
+            read_queue.put(_DONE)
+
+        def submit_stage(executor):
+            # 在途图片达到上限时等待写入阶段释放名额，读取阶段随之被有界队列阻塞
+            submitted = 0
+            finished_readers = 0
+            while finished_readers < self.reader_threads:
+                item = read_queue.get()
+                if item is _DONE:
+                    finished_readers += 1
+                    continue
+                source_path, data, error = item
+                if stopped():
+                    continue
+                slots.acquire()
+                submitted += 1
+                if error is not None:
+                    write_queue.put((source_path, error))
+                    continue
+                try:
+                    if traced:
+                        future = executor.submit(run_traced, render_image, source_path, data, spec, options)
+                    else:
+                        future = executor.submit(render_image, source_path, data, spec, options)
+                except Exception as e:
+                    # 进程池已损坏（例如子进程被系统结束）时逐张报告错误，不让流水线停住
+                    write_queue.put((source_path, e))
+                    continue
+                pending.add(future)
+                future.add_done_callback(lambda future, source_path=source_path: write_queue.put((source_path, future)))
+            if stopped():
+                for future in list(pending):
+                    future.cancel()
+            write_queue.put((_DONE, submitted))
+
+        def write_stage():
+            written = 0
+            submitted = None
+            while submitted is None or written < submitted:
+                source_path, result = write_queue.get()
+                if source_path is _DONE:
+                    submitted = result
+                    continue
+                written += 1
+                if not isinstance(result, Exception):
+                    pending.discard(result)
+                    if result.cancelled():
+                        slots.release()
+                        continue
+                output_path, error = None, None
+                try:
+                    if isinstance(result, Exception):
+                        raise result
+                    data = result.result()
+                    if traced:
+                        data, events = data
+                        add_events(events)
+                    output_path = write_output(output_path_for(source_path, options), data)
+                except Exception as e:
+                    error = e
+                slots.release()
+                result_queue.put((source_path, output_path, error))
+            result_queue.put(_DONE)
+
+        executor = self._executor(workers)
+        threads = [threading.Thread(target=read_stage, name=f"export-read-{index}", daemon=True)
+                   for index in range(self.reader_threads)]
+        threads.append(threading.Thread(target=submit_stage, args=(executor,), name="export-submit", daemon=True))
+        threads.append(threading.Thread(target=write_stage, name="export-write", daemon=True))
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = result_queue.get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            # 正常结束时各阶段都已退出；提前结束时不再读取新的图片，等待在途的图片处理和写入完成
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+            executor.shutdown(wait=True)
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+class ExportJob:
+    # 一次批量导出：统计进度、吞吐量（张/秒、MB/秒）和剩余时间，收集失败的图片，
+    # 可以在图片之间取消。run() 每完成一张图片产出一次 (源文件路径, 输出路径, 异常)，
+    # 调用方在两次产出之间读取统计信息或调用 cancel()
+
+    def __init__(self, source_paths, spec, options, max_workers=None):
+        self.source_paths = list(source_paths)
+        self.spec = spec
+        self.options = options
+        self.engine = ExportEngine(max_workers)
+        self.succeeded = 0
+        self.errors = []  # [(源文件路径, 异常)]
+        self.bytes_processed = 0  # 已处理的源文件大小
+        self.start_time = None
+        self.end_time = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def total(self):
+        return len(self.source_paths)
+
+    @property
+    def completed(self):
+        return self.succeeded + len(self.errors)
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def run(self):
+        self.start_time = time.perf_counter()
+        try:
+            for source_path, output_path, error in self.engine.run(
+                    self.source_paths, self.spec, self.options, self._cancel_event):
+                if error is None:
+                    self.succeeded += 1
+                else:
+                    self.errors.append((source_path, error))
+                try:
+                    self.bytes_processed += os.path.getsize(source_path)
+                except OSError:
+                    pass
+                yield source_path, output_path, error
+        finally:
+            self.end_time = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.perf_counter()) - self.start_time
+
+    @property
+    def images_per_second(self):
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def megabytes_per_second(self):
+        elapsed = self.elapsed
+        return self.bytes_processed / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        # 剩余时间（秒），还没有完成任何图片时返回None
+        rate = self.images_per_second
+        if rate <= 0:
+            return None
+        return (self.total - self.completed) / rate
+
+    def progress_text(self):
+        text = f"已导出 {self.completed}/{self.total} 张，{self.images_per_second:.1f} 张/秒，{self.megabytes_per_second:.1f} MB/秒"
+        eta = self.eta
+        if eta is not None and self.completed < self.total:
+            text += f"，剩余约 {format_duration(eta)}"
+        return text
+
+    def summary(self):
+        text = f"{self.succeeded} 张成功，{len(self.errors)} 张失败"
+        if self.cancelled and self.completed < self.total:
+            text += f"，{self.total - self.completed} 张已取消"
+        return text + f"，用时 {format_duration(self.elapsed)}（{self.images_per_second:.1f} 张/秒，{self.megabytes_per_second:.1f} MB/秒）"
+
+    def error_report(self):
+        return "\n".join(f"{source_path}: {str(error)}" for source_path, error in self.errors)
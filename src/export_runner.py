@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from tracing import logger
+
+
+class ExportRunner(QObject):
+    # 在后台线程中运行 ExportJob，每完成一张图片通过信号把进度交给GUI线程，
+    # 等待导出结果时不阻塞界面，取消按钮可以随时响应
+    # 同一时间只运行一个导出任务
+
+    # 导出进度：(已完成数, 进度说明)
+    progress = pyqtSignal(int, str)
+    # 导出结束（完成、取消或出错）：ExportJob
+    finished = pyqtSignal(object)
+    # 后台线程通知GUI线程，带上任务序号以丢弃已关闭任务的消息
+    _progress = pyqtSignal(int, int, str)
+    _finished = pyqtSignal(int, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.generation = 0
+        self.job = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._progress.connect(self._on_progress)
+        self._finished.connect(self._on_finished)
+
+    @property
+    def running(self):
+        return self.job is not None
+
+    def start(self, job):
+        if self.running:
+            raise RuntimeError("已有导出任务正在运行")
+        self.generation += 1
+        self.job = job
+        self._executor.submit(self._run, self.generation, job)
+
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+
+    def shutdown(self):
+        # 取消正在进行的导出并等待后台线程结束，正在导出的图片完成后才会返回
+        self.cancel()
+        self.generation += 1
+        self.job = None
+        self._executor.shutdown(wait=True)
+
+    def _run(self, generation, job):
+        # 在后台线程中执行
+        try:
+            for _ in job.run():
+                self._progress.emit(generation, job.completed, job.progress_text())
+        except Exception as e:
+            # 单张图片的错误已由 ExportJob 收集，这里只会是整个任务无法继续（如输出文件夹不可写）
+            logger.warning("导出失败: %s", e)
+            job.errors.append((job.options.output_folder, e))
+        self._finished.emit(generation, job)
+
+    def _on_progress(self, generation, completed, text):
+        if generation == self.generation:
+            self.progress.emit(completed, text)
+
+    def _on_finished(self, generation, job):
+        if generation == self.generation:
+            self.job = None
+            self.finished.emit(job)
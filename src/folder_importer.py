@@ -0,0 +1,76 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from folder_scanner import iter_image_batches
+from image_handle import open_handles
+from tracing import logger
+
+
+class FolderImporter(QObject):
+    # 在后台线程中扫描文件夹并读取图片的文件头，找到的图片分批通过信号交给GUI线程，可以随时取消；
+    # 网络文件夹中读取文件头较慢，放在后台线程中界面不会卡顿
+    # 同一时间只扫描一个文件夹，开始新的扫描会取消正在进行的扫描
+
+    # 找到一批图片：[(路径, ImageHandle)]
+    batch_found = pyqtSignal(list)
+    # 扫描进度：(已扫描文件夹数, 已找到图片数)
+    progress = pyqtSignal(int, int)
+    # 扫描结束：(是否被取消, 找到的图片总数, 无法打开的文件 [(路径, 错误信息)])
+    finished = pyqtSignal(bool, int, list)
+    # 后台线程通知GUI线程，带上扫描序号以丢弃已取消扫描的消息
+    _batch = pyqtSignal(int, list)
+    _progress = pyqtSignal(int, int, int)
+    _finished = pyqtSignal(int, bool, int, list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.generation = 0
+        self._cancel_event = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._batch.connect(self._on_batch)
+        self._progress.connect(self._on_progress)
+        self._finished.connect(self._on_finished)
+
+    def start(self, folder):
+        self.cancel()
+        self.generation += 1
+        self._cancel_event = threading.Event()
+        self._executor.submit(self._scan, self.generation, folder, self._cancel_event)
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def shutdown(self):
+        self.cancel()
+        self.generation += 1
+        self._executor.shutdown(wait=False)
+
+    def _scan(self, generation, folder, cancel_event):
+        # 在后台线程中执行
+        found = 0
+        failures = []
+        try:
+            for batch in iter_image_batches(
+                    folder, cancel_event=cancel_event,
+                    progress=lambda dirs, files: self._progress.emit(generation, dirs, files)):
+                found += len(batch)
+                handles, batch_failures = open_handles(batch, cancel_event)
+                failures.extend(batch_failures)
+                if handles:
+                    self._batch.emit(generation, handles)
+        except Exception as e:
+            logger.warning("扫描文件夹失败: %s", e)
+        self._finished.emit(generation, cancel_event.is_set(), found, failures)
+
+    def _on_batch(self, generation, batch):
+        if generation == self.generation:
+            self.batch_found.emit(batch)
+
+    def _on_progress(self, generation, dirs, files):
+        if generation == self.generation:
+            self.progress.emit(dirs, files)
+
+    def _on_finished(self, generation, cancelled, found, failures):
+        if generation == self.generation:
+            self.finished.emit(cancelled, found, failures)
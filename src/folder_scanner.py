@@ -0,0 +1,98 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from tracing import logger
+
+
+# 流式扫描文件夹中的图片：每个子文件夹用 os.scandir 单独扫描，多个子文件夹在线程池中并行，
+# 找到的图片分批返回，不必等整个目录树扫描完；网络共享上目录读取的延迟可以互相重叠
+
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif'})
+
+SCAN_WORKERS = 8
+# 每批最多的文件数，以及最长等待时间（秒），先到者为准
+BATCH_SIZE = 500
+BATCH_INTERVAL = 0.2
+
+
+def is_image_file(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def scan_directory(directory):
+    # 扫描单个文件夹（不递归），返回 (图片路径, 子文件夹路径)；与 os.walk 一样不跟随符号链接文件夹
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif is_image_file(entry.name) and entry.is_file():
+                        files.append(entry.path)
+                except OSError:
+                    continue
+    except OSError as e:
+        logger.warning("无法读取文件夹 %s: %s", directory, e)
+    files.sort()
+    subdirs.sort()
+    return files, subdirs
+
+
+def iter_image_batches(folder, max_workers=SCAN_WORKERS, batch_size=BATCH_SIZE,
+                       batch_interval=BATCH_INTERVAL, cancel_event=None, progress=None):
+    # 生成器，依次返回找到的图片路径列表；同一文件夹内按文件名排序，不同文件夹之间按完成顺序
+    # cancel_event：threading.Event，设置后尽快停止扫描
+    # progress：回调函数 progress(已扫描文件夹数, 已找到图片数)
+    scanned_dirs = 0
+    found_files = 0
+    batch = []
+    last_yield = last_progress = time.monotonic()
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(scan_directory, folder)}
+        try:
+            while pending:
+                if cancelled():
+                    break
+                done, pending = wait(pending, timeout=batch_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    scanned_dirs += 1
+                    found_files += len(files)
+                    batch.extend(files)
+                    pending.update(executor.submit(scan_directory, subdir) for subdir in subdirs)
+
+                # 进度按时间间隔报告，大量小文件夹时不会产生过多回调
+                if progress is not None and (not pending or time.monotonic() - last_progress >= batch_interval):
+                    progress(scanned_dirs, found_files)
+                    last_progress = time.monotonic()
+                while len(batch) >= batch_size and not cancelled():
+                    yield batch[:batch_size]
+                    batch = batch[batch_size:]
+                    last_yield = time.monotonic()
+                if batch and not cancelled() and time.monotonic() - last_yield >= batch_interval:
+                    yield batch
+                    batch = []
+                    last_yield = time.monotonic()
+        finally:
+            # 取消或生成器被提前关闭时，不再启动尚未开始的扫描
+            for future in pending:
+                future.cancel()
+
+    if batch and not cancelled():
+        yield batch
+
+
+def scan_folder(folder, max_workers=SCAN_WORKERS):
+    # 一次性返回文件夹中所有图片的路径，按路径排序
+    file_paths = []
+    for batch in iter_image_batches(folder, max_workers=max_workers):
+        file_paths.extend(batch)
+    file_paths.sort()
+    return file_paths
@@ -0,0 +1,158 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from PIL import ImageFont
+
+from tracing import logger, span
+
+
+# 进程级字体解析：首次使用时扫描一次系统字体目录建立索引，
+# 之后按 (字体族, 粗体, 斜体, 字号) 缓存已加载的字体对象，重复渲染不再访问文件系统
+
+FONT_EXTENSIONS = ('.ttf', '.ttc', '.otf', '.fon')
+
+# 常见中文字体对应的字体文件（常规、粗体、细体）
+CHINESE_FONTS_MAP = {
+    'Microsoft YaHei': ['msyh', 'msyhbd', 'msyhl'],
+    'SimHei': ['simhei'],
+    'SimSun': ['simsun'],
+    'KaiTi': ['simkai'],
+    'FangSong': ['simfang'],
+    'LiSu': ['lisu'],    # 隶书
+    'YouYuan': ['youyuan'],  # 幼圆
+    'DengXian': ['dengxian', 'dengxianbd'],  # 等线
+    'WenQuanYi Micro Hei': ['wqy-microhei'],
+    'Heiti TC': ['stheiti medium', 'stheiti light'],
+    'Arial Unicode MS': ['arial unicode', 'arialuni'],
+    'Noto Sans CJK SC': ['notosanscjk-regular', 'notosanscjksc-regular', 'notosanscjk-bold', 'notosanscjksc-bold'],
+}
+
+# 指定字体不可用时依次尝试的通用中文字体
+FALLBACK_FONTS = ["SimHei", "WenQuanYi Micro Hei", "Heiti TC", "Microsoft YaHei", "SimSun",
+                  "Noto Sans CJK SC", "Arial Unicode MS"]
+
+MAX_CACHED_FONTS = 64
+
+
+def font_directories():
+    if os.name == 'nt':
+        windir = os.environ.get('WINDIR', r"C:\Windows")
+        directories = [os.path.join(windir, 'Fonts')]
+        local_appdata = os.environ.get('LOCALAPPDATA')
+        if local_appdata:
+            directories.append(os.path.join(local_appdata, 'Microsoft', 'Windows', 'Fonts'))
+        return directories
+
+    home = os.path.expanduser('~')
+    if sys.platform == 'darwin':
+        return ['/System/Library/Fonts', '/Library/Fonts', os.path.join(home, 'Library', 'Fonts')]
+
+    data_home = os.environ.get('XDG_DATA_HOME') or os.path.join(home, '.local', 'share')
+    return ['/usr/share/fonts', '/usr/local/share/fonts',
+            os.path.join(home, '.fonts'), os.path.join(data_home, 'fonts')]
+
+
+@lru_cache(maxsize=None)
+def font_index():
+    # 字体文件名（小写、不含扩展名）→ 完整路径，只在第一次使用时扫描
+    index = {}
+    for directory in font_directories():
+        for root, _, files in os.walk(directory):
+            for file in files:
+                stem, ext = os.path.splitext(file)
+                if ext.lower() in FONT_EXTENSIONS:
+                    index.setdefault(stem.lower(), os.path.join(root, file))
+    return index
+
+
+def candidate_names(font_family, bold, italic):
+    # 按优先级列出可能的字体文件名
+    base_name = font_family.lower().replace(' ', '')
+    mapped = CHINESE_FONTS_MAP.get(font_family, [])
+    names = []
+
+    if bold and italic:
+        names.extend([f"{font_family} Bold Italic", f"{font_family}-BoldItalic",
+                      base_name + 'bi', base_name + 'bdit', base_name + 'bolditalic', base_name + '-bolditalic'])
+    elif bold:
+        names.extend([f"{font_family} Bold", f"{font_family}-Bold", base_name + 'bd', base_name + 'bold', base_name + '-bold'])
+        if len(mapped) > 1:
+            names.append(mapped[1])
+    elif italic:
+        names.extend([f"{font_family} Italic", f"{font_family}-Italic", base_name + 'i', base_name + 'italic', base_name + '-italic'])
+
+    names.extend([font_family, base_name])
+    names.extend(mapped[:1])
+    return [name.lower() for name in names]
+
+
+@lru_cache(maxsize=None)
+def resolve_font_path(font_family, bold=False, italic=False):
+    # 返回最合适的字体文件路径，找不到任何可用字体时返回None
+    index = font_index()
+
+    for name in candidate_names(font_family, bold, italic):
+        if name in index:
+            return index[name]
+
+    for fallback_font in FALLBACK_FONTS:
+        for name in candidate_names(fallback_font, False, False):
+            if name in index:
+                logger.warning("未找到字体 %s，使用回退字体: %s", font_family, index[name])
+                return index[name]
+
+    logger.warning("未找到字体 %s，使用PIL默认字体", font_family)
+    return None
+
+
+class FontCache:
+    # 已加载字体对象的LRU缓存，超过容量时淘汰最久未使用的字体
+
+    def __init__(self, max_size=MAX_CACHED_FONTS):
+        self.max_size = max_size
+        self._fonts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, font_family, font_size, bold=False, italic=False):
+        key = (font_family, bold, italic, font_size)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                return font
+
+        font = self._load(font_family, font_size, bold, italic)
+
+        with self._lock:
+            self._fonts[key] = font
+            self._fonts.move_to_end(key)
+            while len(self._fonts) > self.max_size:
+                self._fonts.popitem(last=False)
+        return font
+
+    def _load(self, font_family, font_size, bold, italic):
+        with span("font_resolve", family=font_family, size=font_size):
+            font_path = resolve_font_path(font_family, bold, italic)
+            if font_path is not None:
+                try:
+                    font = ImageFont.truetype(font_path, font_size)
+                    logger.debug("使用字体 %s，字号 %s", font_path, font_size)
+                    return font
+                except Exception as e:
+                    logger.warning("无法加载字体文件 %s: %s", font_path, e)
+            return ImageFont.load_default()
+
+    def clear(self):
+        with self._lock:
+            self._fonts.clear()
+
+
+_font_cache = FontCache()
+
+
+def get_font(font_family, font_size, bold=False, italic=False):
+    # 限制字体大小范围，防止过大或过小的字体导致问题
+    font_size = max(4, min(int(font_size), 500))
+    return _font_cache.get(font_family, font_size, bold, italic)
@@ -0,0 +1,98 @@
+import threading
+from PIL import Image
+
+from memory_cache import MemoryLRUCache
+from tracing import span
+
+
+# 图片句柄：登记表中只保存路径和文件头信息（尺寸、模式、格式），不保持文件打开；
+# 需要像素时才解码，解码结果保存在按内存预算淘汰的进程级LRU缓存中
+
+DECODED_IMAGE_CACHE_BYTES = 512 * 1024 * 1024
+
+_decoded_images = MemoryLRUCache(DECODED_IMAGE_CACHE_BYTES)
+# 按路径分组的解码锁，多个线程同时请求同一张图片时只解码一次
+_decode_locks = [threading.Lock() for _ in range(16)]
+
+
+def set_decoded_image_budget(max_bytes):
+    # 调整已解码图片缓存的内存预算，超出部分立即淘汰
+    _decoded_images.set_max_bytes(max_bytes)
+
+
+def clear_decoded_images():
+    _decoded_images.clear()
+
+
+def decode_image(path):
+    # 读取并完整解码图片，返回后文件已关闭
+    with span("decode", path=path), Image.open(path) as img:
+        img.load()
+        return img
+
+
+class ImageHandle:
+    __slots__ = ('path', 'size', 'mode', 'format')
+
+    def __init__(self, path, size, mode, format):
+        self.path = path
+        self.size = size
+        self.mode = mode
+        self.format = format
+
+    @classmethod
+    def open(cls, path):
+        # 只读取文件头；文件无法识别时抛出异常
+        with Image.open(path) as img:
+            return cls(path, img.size, img.mode, img.format)
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    def load(self):
+        # 返回解码后的图片，可以在后台线程中调用；返回的图片被缓存共享，调用方不能修改
+        img = _decoded_images.get(self.path)
+        if img is not None:
+            return img
+        with _decode_locks[hash(self.path) % len(_decode_locks)]:
+            img = _decoded_images.get(self.path)
+            if img is None:
+                img = _decoded_images.put(self.path, decode_image(self.path))
+        return img
+
+    def load_reduced(self, size):
+        # 返回不小于 size 的图片，用于生成预览等缩小后的图片；
+        # 原图已解码时直接使用，否则JPEG按1/2~1/8缩小解码（不放入缓存），其他格式完整解码
+        img = _decoded_images.get(self.path)
+        if img is not None or self.format != 'JPEG':
+            return img if img is not None else self.load()
+        with span("decode", path=self.path, draft=True), Image.open(self.path) as img:
+            img.draft(img.mode, size)
+            img.load()
+            return img
+
+    def is_loaded(self):
+        return self.path in _decoded_images
+
+    def __repr__(self):
+        return f"ImageHandle({self.path!r}, size={self.size}, mode={self.mode!r}, format={self.format!r})"
+
+
+def open_handles(paths, cancel_event=None):
+    # 依次读取文件头，可以在后台线程中调用；返回 ([(路径, 句柄)], [(路径, 错误信息)])
+    # cancel_event：threading.Event，设置后不再读取剩余的文件
+    handles = []
+    failures = []
+    for path in paths:
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        try:
+            handles.append((path, ImageHandle.open(path)))
+        except Exception as e:
+            failures.append((path, str(e)))
+    return handles, failures
@@ -0,0 +1,73 @@
+import os
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+
+from memory_cache import MemoryLRUCache
+from qt_image import pil_to_pixmap
+from tracing import logger
+
+
+# 文件列表缩略图（QPixmap）缓存的内存上限，约可容纳数百张200像素的缩略图
+PIXMAP_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def pixmap_nbytes(pixmap):
+    return pixmap.width() * pixmap.height() * 4
+
+
+class ImageListModel(QAbstractListModel):
+    # 文件列表的数据模型，每一行对应 ImageRegistry 中的一张图片
+    # 视图只会查询可见行的数据，缩略图在第一次显示时才请求生成，并保存在有容量上限的缓存中；
+    # 被淘汰的缩略图再次可见时重新请求（通常命中磁盘缓存）
+
+    def __init__(self, images, thumbnail_loader, max_bytes=PIXMAP_CACHE_BYTES, parent=None):
+        super().__init__(parent)
+        self.images = images
+        self.thumbnail_loader = thumbnail_loader
+        self._pixmaps = MemoryLRUCache(max_bytes, sizeof=pixmap_nbytes)
+        self._failed = set()
+        thumbnail_loader.loaded.connect(self.set_thumbnail)
+        thumbnail_loader.failed.connect(self.on_thumbnail_failed)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.images)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self.images):
+            return None
+        path = self.images[index.row()]['path']
+        if role == Qt.DisplayRole:
+            return os.path.basename(path)
+        if role == Qt.ToolTipRole:
+            return path
+        if role == Qt.DecorationRole:
+            pixmap = self._pixmaps.get(path)
+            if pixmap is None and path not in self._failed:
+                self.thumbnail_loader.request([path])
+            return pixmap
+        return None
+
+    def add_images(self, entries):
+        # entries：[(路径, 图片信息)]，调用方保证路径不重复且尚未登记
+        if not entries:
+            return
+        first = len(self.images)
+        self.beginInsertRows(QModelIndex(), first, first + len(entries) - 1)
+        for path, info in entries:
+            self.images.add(path, info)
+        self.endInsertRows()
+
+    def path_at(self, row):
+        return self.images[row]['path']
+
+    def set_thumbnail(self, path, thumbnail):
+        row = self.images.index_of(path)
+        if row < 0:
+            return
+        self._pixmaps.put(path, pil_to_pixmap(thumbnail))
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def on_thumbnail_failed(self, path, error):
+        # 缩略图失败不影响添加水印，文件仍保留在列表中，只是没有图标；不再重复请求
+        self._failed.add(path)
+        logger.warning("无法创建缩略图 %s: %s", os.path.basename(path), error)
@@ -0,0 +1,101 @@
+import os
+import hashlib
+
+
+# 已导入图片的登记表：按导入顺序保存，同时按规范化路径建立索引，
+# 去重、按路径查找和删除都是O(1)；可选按文件内容建立索引，识别不同路径下的相同文件
+
+CONTENT_HASH_CHUNK = 1024 * 1024
+
+
+def path_key(path):
+    # 规范化路径：绝对路径，Windows下不区分大小写
+    return os.path.normcase(os.path.abspath(path))
+
+
+def content_hash(path):
+    hasher = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CONTENT_HASH_CHUNK), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ImageRegistry:
+    # 条目是图片信息字典（至少包含 'path'），可以像列表一样按位置访问和遍历
+    # hash_content：为True时登记前读取整个文件计算内容哈希，内容相同的文件只登记一次
+
+    def __init__(self, hash_content=False):
+        self.hash_content = hash_content
+        self._entries = {}  # 规范化路径 → 图片信息，dict保持插入顺序
+        self._content_index = {}  # 内容哈希 → 规范化路径
+        self._order = []  # 按位置访问用的条目列表，删除后重建
+        self._positions = {}  # 规范化路径 → 位置，与 _order 同步
+        self._order_valid = True
+
+    def add(self, path, info):
+        # 返回是否登记成功；路径或内容（hash_content为True时）重复时不登记
+        key = path_key(path)
+        if key in self._entries:
+            return False
+        if self.hash_content:
+            digest = content_hash(path)
+            if digest in self._content_index:
+                return False
+            info['content_hash'] = digest
+            self._content_index[digest] = key
+
+        self._entries[key] = info
+        if self._order_valid:
+            self._positions[key] = len(self._order)
+            self._order.append(info)
+        return True
+
+    def remove(self, path):
+        # 删除后按位置访问时才重建位置索引，连续删除不会反复移动列表
+        info = self._entries.pop(path_key(path), None)
+        if info is None:
+            return None
+        digest = info.get('content_hash')
+        if digest is not None:
+            self._content_index.pop(digest, None)
+        self._order_valid = False
+        return info
+
+    def get(self, path, default=None):
+        return self._entries.get(path_key(path), default)
+
+    def find_by_content(self, digest):
+        key = self._content_index.get(digest)
+        return self._entries.get(key) if key is not None else None
+
+    def index_of(self, path):
+        # 返回条目的位置，不存在时返回-1
+        self._ensure_order()
+        return self._positions.get(path_key(path), -1)
+
+    def clear(self):
+        self._entries.clear()
+        self._content_index.clear()
+        self._order = []
+        self._positions = {}
+        self._order_valid = True
+
+    def _ensure_order(self):
+        if not self._order_valid:
+            self._order = list(self._entries.values())
+            self._positions = {key: position for position, key in enumerate(self._entries)}
+            self._order_valid = True
+
+    def __getitem__(self, index):
+        self._ensure_order()
+        return self._order[index]
+
+    def __contains__(self, path):
+        return path_key(path) in self._entries
+
+    def __iter__(self):
+        return iter(self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,25 +1,60 @@
 import sys
 import os
 import json
+import multiprocessing
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
-    QFileDialog, QLabel, QListWidget, QListWidgetItem, QSlider, QComboBox,
+    QFileDialog, QLabel, QListView, QSlider, QComboBox,
     QLineEdit, QGridLayout, QSplitter, QGroupBox, QFormLayout, QCheckBox,
-    QFrame, QInputDialog, QMessageBox, QAction, QMenu, QMenuBar, QColorDialog, QSizePolicy, QScrollArea
+    QFrame, QInputDialog, QMessageBox, QAction, QMenu, QMenuBar, QColorDialog, QSizePolicy, QScrollArea, QSpinBox, QProgressDialog
 )
-from PyQt5.QtGui import QPixmap, QPainter, QColor, QFont, QIcon, QBrush, QPen, QFontDatabase, QImage
+from PyQt5.QtGui import QPixmap, QPainter, QColor, QFont, QBrush, QPen, QFontDatabase
 from PyQt5.QtCore import Qt, QPoint, QSize
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
+
+from watermark_spec import WatermarkSpec
+from watermark_renderer import render_watermark, watermark_layer
+from export_engine import ExportJob, ExportOptions, default_worker_count
+from watermark_template import TEMPLATE_DIR, image_watermark_size
+from preview_renderer import PreviewRenderer, PREFETCH_NEIGHBORS
+from preview_scheduler import PreviewScheduler
+from thumbnail_loader import ThumbnailLoader
+from thumbnail_cache import ThumbnailCache
+from folder_importer import FolderImporter
+from export_runner import ExportRunner
+from image_registry import ImageRegistry, path_key
+from image_list_model import ImageListModel
+from image_handle import open_handles
+from qt_image import pil_to_pixmap
+import tracing
+from tracing import logger
+
 
 class WatermarkApp(QMainWindow):
     def __init__(self):
         super().__init__()
         # 初始化实例变量
         self.current_image_index = -1
-        self.images = []
+        self.images = ImageRegistry()
+        self.preview_renderer = PreviewRenderer()
+        self.preview_scheduler = PreviewScheduler(self.preview_renderer.render, parent=self)
+        self.preview_scheduler.rendered.connect(self.show_preview_image)
+        self.thumbnail_loader = ThumbnailLoader(cache=ThumbnailCache(), parent=self)
+        self.file_model = ImageListModel(self.images, self.thumbnail_loader, parent=self)
+        self.folder_importer = FolderImporter(parent=self)
+        self.folder_importer.batch_found.connect(self.add_image_handles)
+        self.folder_importer.progress.connect(self.on_folder_import_progress)
+        self.folder_importer.finished.connect(self.on_folder_import_finished)
+        self.export_runner = ExportRunner(parent=self)
+        self.export_runner.progress.connect(self.on_export_progress)
+        self.export_runner.finished.connect(self.on_export_finished)
+        self.export_progress = None
         self.watermark_pos = QPoint(100, 100)
         self.dragging = False
         self.drag_start = QPoint()
+        self.drag_base_pixmap = None
+        self.drag_layer = None
+        self.drag_layer_pixmap = None
         self.output_folder_path = ""
         self.current_color = "#000000"
         self.current_stroke_color = "#FFFFFF"
@@ -67,13 +102,31 @@ class WatermarkApp(QMainWindow):
         file_ops_layout.addWidget(self.import_folder_btn)
         
         # 文件列表
-        self.file_list = QListWidget()
-        self.file_list.setViewMode(QListWidget.IconMode)
+        # 文件列表（模型/视图）：只为可见的行生成缩略图，大量图片时也能流畅滚动
+        self.file_list = QListView()
+        self.file_list.setViewMode(QListView.IconMode)
         self.file_list.setIconSize(QSize(200, 200))
-        self.file_list.setResizeMode(QListWidget.Adjust)
-        self.file_list.setMovement(QListWidget.Static)
-        self.file_list.itemClicked.connect(self.on_file_selected)
+        self.file_list.setResizeMode(QListView.Adjust)
+        self.file_list.setMovement(QListView.Static)
         self.file_list.setSpacing(10)  # 增加缩略图之间的间距
+        # 所有行使用相同的尺寸，布局时不需要逐行计算；缩略图加载前后列表不会跳动
+        self.file_list.setUniformItemSizes(True)
+        self.file_list.setGridSize(QSize(210, 230))
+        self.file_list.setLayoutMode(QListView.Batched)
+        self.file_list.setModel(self.file_model)
+        # 点击或用方向键切换当前图片都会刷新预览
+        self.file_list.selectionModel().currentChanged.connect(self.on_file_selected)
+        
+        # 导入文件夹的进度和取消按钮，只在扫描时显示
+        self.import_progress_widget = QWidget()
+        import_progress_layout = QHBoxLayout(self.import_progress_widget)
+        import_progress_layout.setContentsMargins(0, 0, 0, 0)
+        self.import_progress_label = QLabel()
+        self.import_cancel_btn = QPushButton("取消")
+        self.import_cancel_btn.clicked.connect(self.cancel_folder_import)
+        import_progress_layout.addWidget(self.import_progress_label, 1)
+        import_progress_layout.addWidget(self.import_cancel_btn)
+        self.import_progress_widget.hide()
         
         # 导出按钮
         self.export_btn = QPushButton("导出图片")
@@ -95,6 +148,7 @@ class WatermarkApp(QMainWindow):
         left_layout.addLayout(file_ops_layout)
         left_layout.addWidget(QLabel("已导入图片:"))
         left_layout.addWidget(self.file_list)
+        left_layout.addWidget(self.import_progress_widget)
         left_layout.addWidget(QLabel("输出文件夹:"))
         left_layout.addLayout(folder_layout)
         left_layout.addWidget(self.export_btn)
@@ -320,6 +374,39 @@ class WatermarkApp(QMainWindow):
         position_group.setLayout(position_layout)
         scroll_layout.addWidget(position_group)
         
+        # 平铺水印：旋转后的水印按网格铺满整张图片，拖动水印可以移动整个网格
+        tile_group = QGroupBox("平铺水印")
+        tile_layout = QFormLayout()
+        
+        self.tile_checkbox = QCheckBox("平铺重复水印")
+        self.tile_checkbox.stateChanged.connect(self.toggle_tile_options)
+        tile_layout.addRow(self.tile_checkbox)
+        
+        self.tile_spacing = QSpinBox()
+        self.tile_spacing.setRange(0, 2000)
+        self.tile_spacing.setValue(100)
+        self.tile_spacing.setSuffix(" 像素")
+        self.tile_spacing.setEnabled(False)
+        self.tile_spacing.valueChanged.connect(self.update_preview)
+        tile_layout.addRow("间距:", self.tile_spacing)
+        
+        self.tile_angle = QSpinBox()
+        self.tile_angle.setRange(-90, 90)
+        self.tile_angle.setValue(30)
+        self.tile_angle.setSuffix("°")
+        self.tile_angle.setEnabled(False)
+        self.tile_angle.valueChanged.connect(self.update_preview)
+        tile_layout.addRow("旋转角度:", self.tile_angle)
+        
+        self.tile_stagger = QCheckBox("隔行错开")
+        self.tile_stagger.setChecked(True)
+        self.tile_stagger.setEnabled(False)
+        self.tile_stagger.stateChanged.connect(self.update_preview)
+        tile_layout.addRow(self.tile_stagger)
+        
+        tile_group.setLayout(tile_layout)
+        scroll_layout.addWidget(tile_group)
+        
         # 导出设置
         export_group = QGroupBox("导出设置")
         export_layout = QFormLayout()
@@ -375,6 +462,12 @@ class WatermarkApp(QMainWindow):
         self.percent_slider.valueChanged.connect(lambda value: self.percent_label.setText(f"大小: {value}%"))
         export_layout.addRow(self.percent_label, self.percent_slider)
         
+        # 先缩放再添加水印：缩小导出大图时更快，占用内存更少
+        self.resize_first = QCheckBox("先缩放图片再添加水印（更快）")
+        self.resize_first.setToolTip("水印按相同比例缩放后绘制，效果与先添加水印再缩放基本一致")
+        self.resize_first.setEnabled(False)
+        export_layout.addRow(self.resize_first)
+        
         # 文件命名选项
         self.preserve_filename = QCheckBox("保留原始文件名")
         self.preserve_filename.setChecked(True)
@@ -395,6 +488,12 @@ class WatermarkApp(QMainWindow):
         export_layout.addRow("文件前缀:", self.prefix)
         export_layout.addRow("文件后缀:", self.suffix)
         
+        # 并行导出进程数
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, max(64, default_worker_count()))
+        self.workers_spin.setValue(default_worker_count())
+        export_layout.addRow("并行进程数:", self.workers_spin)
+        
         export_group.setLayout(export_layout)
         scroll_layout.addWidget(export_group)
         
@@ -440,7 +539,6 @@ class WatermarkApp(QMainWindow):
         main_layout.addWidget(main_splitter)
         
         # 初始化变量
-        self.images = []
         self.current_image_index = -1
         self.watermark_pos = QPoint(100, 100)
         self.dragging = False
@@ -508,112 +606,112 @@ class WatermarkApp(QMainWindow):
         folder_path = QFileDialog.getExistingDirectory(self, "选择文件夹", "")
         
         if folder_path:
-            valid_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif']
-            file_paths = []
-            
-            for root, _, files in os.walk(folder_path):
-                for file in files:
-                    if any(file.lower().endswith(ext) for ext in valid_extensions):
-                        file_paths.append(os.path.join(root, file))
-            
-            if file_paths:
-                self.add_images(file_paths)
-            else:
-                QMessageBox.warning(self, "警告", "所选文件夹中没有支持的图片文件")
+            # 在后台扫描文件夹，找到的图片分批加入列表
+            self.import_progress_label.setText("正在扫描文件夹...")
+            self.import_progress_widget.show()
+            self.folder_importer.start(folder_path)
+    
+    def cancel_folder_import(self):
+        self.folder_importer.cancel()
+    
+    def on_folder_import_progress(self, scanned_dirs, found_files):
+        self.import_progress_label.setText(f"已扫描 {scanned_dirs} 个文件夹，找到 {found_files} 张图片")
+    
+    def on_folder_import_finished(self, cancelled, found_files, failures):
+        self.import_progress_widget.hide()
+        if not cancelled and found_files == 0:
+            QMessageBox.warning(self, "警告", "所选文件夹中没有支持的图片文件")
+        self.report_open_failures(failures)
+    
+    def report_open_failures(self, failures):
+        # 无法打开的文件汇总后只提示一次，详细信息中列出每个文件的错误
+        if not failures:
+            return
+        message = QMessageBox(QMessageBox.Warning, "错误", f"{len(failures)} 个文件无法打开，已跳过", QMessageBox.Ok, self)
+        message.setDetailedText("\n".join(f"{path}: {error}" for path, error in failures))
+        message.exec_()
     
     def add_images(self, file_paths):
-        for file_path in file_paths:
-            # 检查文件是否已存在
-            if any(os.path.abspath(img['path']) == os.path.abspath(file_path) for img in self.images):
+        # 读取所选文件的文件头后加入列表；已导入的文件不再重复读取
+        handles, failures = open_handles([file_path for file_path in file_paths if file_path not in self.images])
+        self.add_image_handles(handles)
+        self.report_open_failures(failures)
+    
+    def add_image_handles(self, handles):
+        # handles：[(路径, ImageHandle)]，文件头已在调用方（导入文件夹时为后台线程）读取
+        new_entries = []
+        new_keys = set()
+        for file_path, handle in handles:
+            # 检查文件是否已存在（按规范化路径索引，O(1)）
+            key = path_key(file_path)
+            if file_path in self.images or key in new_keys:
                 continue
             
-            try:
-                # 打开图片并创建缩略图
-                img = Image.open(file_path)
-                
-                # 保存图片信息
-                self.images.append({
-                    'path': file_path,
-                    'image': img,
-                    'original_path': file_path
-                })
-                
-                # 创建列表项
-                item = QListWidgetItem(os.path.basename(file_path))
-                
-                # 创建缩略图用于显示
-                thumbnail = img.copy()
-                thumbnail.thumbnail((200, 200))
-                
-                # 转换为QPixmap
-                try:
-                    # 尝试直接使用PyQt5的QImage转换
-                    if thumbnail.mode == 'RGBA':
-                        data = thumbnail.tobytes("raw", "RGBA")
-                        q_image = QImage(data, thumbnail.width, thumbnail.height, QImage.Format_RGBA8888)
-                    else:
-                        data = thumbnail.tobytes("raw", "RGBX")
-                        q_image = QImage(data, thumbnail.width, thumbnail.height, QImage.Format_RGBX8888)
-                    pixmap = QPixmap.fromImage(q_image)
-                    item.setIcon(QIcon(pixmap))
-                    self.file_list.addItem(item)
-                except Exception as e:
-                    QMessageBox.warning(self, "错误", f"无法创建缩略图: {str(e)}")
-                    # 如果无法创建缩略图，仍添加文件但不显示缩略图
-                    self.file_list.addItem(item)
-                
-            except Exception as e:
-                QMessageBox.warning(self, "错误", f"无法打开文件 {os.path.basename(file_path)}: {str(e)}")
+            # 保存图片信息，缩略图在列表中显示到这一行时才生成；像素数据在预览时才解码
+            new_entries.append((file_path, {
+                'path': file_path,
+                'handle': handle,
+                'original_path': file_path
+            }))
+            new_keys.add(key)
+        
+        self.file_model.add_images(new_entries)
         
         # 如果是第一次导入图片，自动选择第一张
         if len(self.images) > 0 and self.current_image_index == -1:
             self.current_image_index = 0
-            self.file_list.setCurrentRow(0)
+            self.file_list.setCurrentIndex(self.file_model.index(0))
             self.update_preview()
+            self.prefetch_neighbors()
         
         # 启用导出按钮
         self.export_btn.setEnabled(len(self.images) > 0)
     
-    def on_file_selected(self, item):
-        index = self.file_list.row(item)
+    def on_file_selected(self, model_index):
+        index = model_index.row()
         if 0 <= index < len(self.images):
             self.current_image_index = index
             self.update_preview()
+            self.prefetch_neighbors()
     
     def update_preview(self):
         if self.current_image_index < 0 or self.current_image_index >= len(self.images):
             return
         
         img_info = self.images[self.current_image_index]
-        img = img_info['image'].copy()
-        
-        # 添加水印
-        watermarked_img = self.add_watermark_to_image(img)
+        try:
+            spec = self.watermark_spec()
+        except ValueError:
+            return  # 忽略无效输入（例如正在编辑的字体大小）
         
-        # 调整预览大小以适应窗口，完全利用可用空间
+        # 在后台线程中，于缩小到预览窗口大小的代理图上添加水印；
+        # 连续的刷新请求会被合并，只显示最新参数的渲染结果
         preview_size = self.preview_label.size()
-        
-        # 计算合适的显示大小，移除最大缩放限制，让图片尽可能大
-        img_width, img_height = watermarked_img.size
-        scale = min(preview_size.width() / img_width, preview_size.height() / img_height)  # 移除最大缩放限制，让图片完全填充预览区域
-        new_width = int(img_width * scale)
-        new_height = int(img_height * scale)
-        
-        # 调整图片大小
-        resized_img = watermarked_img.resize((new_width, new_height))
+        display_size = (preview_size.width(), preview_size.height())
+        self.preview_scheduler.request(img_info['path'], img_info['handle'], spec, display_size)
+    
+    def prefetch_neighbors(self):
+        # 在后台预先生成相邻图片的预览代理图，切换到下一张或上一张时可以立即显示
+        preview_size = self.preview_label.size()
+        display_size = (preview_size.width(), preview_size.height())
+        neighbors = []
+        for offset in range(1, PREFETCH_NEIGHBORS + 1):
+            for index in (self.current_image_index + offset, self.current_image_index - offset):
+                if 0 <= index < len(self.images):
+                    img_info = self.images[index]
+                    neighbors.append((img_info['path'], img_info['handle']))
+        self.preview_renderer.prefetch(neighbors, display_size)
+    
+    def show_preview_image(self, img):
+        # 拖动水印时显示的是叠加层，等松开鼠标后的渲染结果
+        if self.dragging:
+            return
         
         # 转换为QPixmap并显示
         try:
-            # 尝试直接使用PyQt5的QImage转换
-            if resized_img.mode == 'RGBA':
-                data = resized_img.tobytes("raw", "RGBA")
-                q_image = QImage(data, resized_img.width, resized_img.height, QImage.Format_RGBA8888)
-            else:
-                data = resized_img.tobytes("raw", "RGBX")
-                q_image = QImage(data, resized_img.width, resized_img.height, QImage.Format_RGBX8888)
-            pixmap = QPixmap.fromImage(q_image)
+            pixmap = pil_to_pixmap(img)
         except Exception as e:
-            print(f"转换图像失败: {str(e)}")
+            logger.warning("转换图像失败: %s", e)
             return
         self.preview_label.setPixmap(pixmap)
     
@@ -647,25 +745,27 @@ class WatermarkApp(QMainWindow):
         
         if file_path:
             try:
-                # 尝试打开图片
-                img = Image.open(file_path).convert('RGBA')
-                
-                # 保存图片水印信息
-                self.image_watermark_path = file_path
-                self.image_watermark = img
-                self.image_watermark_width, self.image_watermark_height = img.size
-                
-                # 更新UI显示
-                self.image_path_label.setText(os.path.basename(file_path))
-                self.image_width_input.setText(str(self.image_watermark_width))
-                self.image_height_input.setText(str(self.image_watermark_height))
-                
-                # 更新预览
-                self.update_preview()
-                
+                self.set_image_watermark(file_path)
             except Exception as e:
                 QMessageBox.warning(self, "错误", f"无法打开图片: {str(e)}")
     
+    def set_image_watermark(self, file_path):
+        # 打开图片
+        img = Image.open(file_path).convert('RGBA')
+        
+        # 保存图片水印信息
+        self.image_watermark_path = file_path
+        self.image_watermark = img
+        self.image_watermark_width, self.image_watermark_height = img.size
+        
+        # 更新UI显示
+        self.image_path_label.setText(os.path.basename(file_path))
+        self.image_width_input.setText(str(self.image_watermark_width))
+        self.image_height_input.setText(str(self.image_watermark_height))
+        
+        # 更新预览
+        self.update_preview()
+    
     def toggle_image_resize_options(self):
         method = self.image_resize_method.currentText()
         
@@ -699,486 +799,82 @@ class WatermarkApp(QMainWindow):
         except ValueError:
             pass  # 忽略无效输入
     
-    def add_watermark_to_image(self, img):
-        # 确保图片支持透明度
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-        
-        # 创建一个可绘制的副本
-        watermark_img = Image.new('RGBA', img.size, (255, 255, 255, 0))
-        
-        # 根据水印类型添加水印
+    def image_watermark_target_size(self):
+        # 根据选择的调整方式计算水印图片大小
+        return image_watermark_size(
+            (self.image_watermark_width, self.image_watermark_height),
+            self.image_resize_method.currentText(),
+            self.image_watermark_scale,
+            self.image_width_input.text(),
+            self.image_height_input.text()
+        )
+    
+    def watermark_anchor(self):
+        # 将预览窗口中的水印位置换算为图片中的相对位置
         if self.watermark_type == "text":
-            draw = ImageDraw.Draw(watermark_img)
-            
-            # 获取水印文本和设置
-            text = self.watermark_text.text()
-            if not text:
-                return img
-            
-            font_size = int(self.font_size.currentText())
-            transparency = self.transparency.value()
-            
-            # 解析颜色（从新的颜色选择器获取）
-            color_code = self.current_color
-            r = int(color_code[1:3], 16)
-            g = int(color_code[3:5], 16)
-            b = int(color_code[5:7], 16)
-            
-            # 创建字体（使用默认字体）
-            font = None
-            font_family = "SimHei"  # 使用默认中文字体
-            bold = self.bold_checkbox.isChecked()
-            italic = False  # 斜体功能已移除
-            
-            print(f"使用字体: {font_family}, 粗体: {bold}")
-            
-            try:
-                # 验证字体大小是有效的数字
-                try:
-                    font_size = int(font_size) if isinstance(font_size, str) else font_size
-                    # 限制字体大小范围，防止过大或过小的字体导致问题
-                    font_size = max(4, min(font_size, 500))
-                except ValueError:
-                    print(f"无效的字体大小: {font_size}，使用默认大小24")
-                    font_size = 24
-                
-                # 构建常见中文字体的映射表
-                chinese_fonts_map = {
-                    'Microsoft YaHei': ['msyh.ttc', 'msyhbd.ttc', 'msyhl.ttc'],
-                    'SimHei': ['simhei.ttf'],
-                    'SimSun': ['simsun.ttc'],
-                    'KaiTi': ['simkai.ttf'],
-                    'FangSong': ['simfang.ttf'],
-                    'LiSu': ['lisu.ttf'],    # 隶书
-                    'YouYuan': ['youyuan.ttf'],  # 幼圆
-                    'DengXian': ['dengxian.ttc', 'dengxianbd.ttc']  # 等线
-                }
-                
-                # 初始化Windows字体目录路径（如果适用）
-                windows_font_dir = r"C:\Windows\Fonts" if os.name == 'nt' else None
-                
-                # 改进的字体加载策略
-                # 1. 首先尝试使用PIL的ImageFont.truetype直接加载字体
-                # 构建可能的字体变体名称
-                font_variants = []
-                if bold and italic:
-                    font_variants.extend([
-                        f"{font_family} Bold Italic",
-                        f"{font_family}-BoldItalic",
-                        f"{font_family} Bold-Italic",
-                        f"{font_family} BI"
-                    ])
-                elif bold:
-                    font_variants.extend([
-                        f"{font_family} Bold",
-                        f"{font_family}-Bold",
-                        f"{font_family}bd"
-                    ])
-                elif italic:
-                    font_variants.extend([
-                        f"{font_family} Italic",
-                        f"{font_family}-Italic",
-                        f"{font_family}i"
-                    ])
-                font_variants.append(font_family)
-                
-                print(f"尝试的字体变体: {font_variants}")
-                
-                # 尝试加载字体变体
-                for variant in font_variants:
-                    try:
-                        font = ImageFont.truetype(variant, font_size)
-                        print(f"成功加载字体变体: {variant}")
-                        break
-                    except Exception as e:
-                        print(f"无法加载字体变体 {variant}: {str(e)}")
-                        # 继续尝试下一个变体，不中断程序
-                        continue
-                
-                # 2. 如果直接使用字体名称失败且是Windows系统，尝试查找字体文件
-                if font is None and windows_font_dir and os.path.exists(windows_font_dir):
-                    print(f"在Windows字体目录中查找: {windows_font_dir}")
-                    
-                    # 构建搜索的字体文件列表
-                    font_files = []
-                    
-                    # 先检查是否是常见中文字体
-                    if font_family in chinese_fonts_map:
-                        # 根据粗体和斜体选择合适的字体文件
-                        if bold and italic and len(chinese_fonts_map[font_family]) > 3:
-                            font_files = [os.path.join(windows_font_dir, chinese_fonts_map[font_family][2])]
-                        elif bold and len(chinese_fonts_map[font_family]) > 1:
-                            font_files = [os.path.join(windows_font_dir, chinese_fonts_map[font_family][1])]
-                        else:
-                            font_files = [os.path.join(windows_font_dir, chinese_fonts_map[font_family][0])]
-                        print(f"添加常见中文字体文件路径: {font_files}")
-                    
-                    # 根据粗体和斜体设置构建可能的字体文件名
-                    if not font_files:
-                        base_name = font_family.lower().replace(' ', '')
-                        extensions = ['.ttf', '.ttc', '.otf', '.fon']
-                        
-                        # 构建可能的文件基础名称变体
-                        file_basenames = []
-                        if bold and italic:
-                            file_basenames.extend([base_name, base_name+'bi', base_name+'bdit', base_name+'bolditalic'])
-                        elif bold:
-                            file_basenames.extend([base_name, base_name+'bd', base_name+'bold'])
-                        elif italic:
-                            file_basenames.extend([base_name, base_name+'i', base_name+'italic'])
-                        else:
-                            file_basenames.append(base_name)
-                        
-                        # 去重
-                        file_basenames = list(set(file_basenames))
-                        print(f"尝试的字体文件基础名称: {file_basenames}")
-                        
-                        # 生成完整的文件路径
-                        for bn in file_basenames:
-                            for ext in extensions:
-                                font_files.append(os.path.join(windows_font_dir, bn + ext))
-                    
-                    # 尝试加载字体文件
-                    for font_file in font_files:
-                        try:
-                            if os.path.exists(font_file):
-                                print(f"尝试加载字体文件: {font_file}")
-                                font = ImageFont.truetype(font_file, font_size)
-                                print(f"成功加载字体文件: {font_file}")
-                                break
-                        except Exception as e:
-                            print(f"无法加载字体文件 {font_file}: {str(e)}")
-                            # 继续尝试下一个文件，不中断程序
-                            continue
-                
-                # 3. 如果以上方法都失败，尝试通用的中文字体回退列表
-                if font is None:
-                    print("尝试加载通用中文字体")
-                    fallback_fonts = ["SimHei", "WenQuanYi Micro Hei", "Heiti TC", "Microsoft YaHei", "SimSun", "Arial Unicode MS"]
-                    
-                    for fallback_font in fallback_fonts:
-                        try:
-                            font = ImageFont.truetype(fallback_font, font_size)
-                            print(f"成功加载回退字体: {fallback_font}")
-                            break
-                        except Exception as e:
-                            print(f"无法加载回退字体 {fallback_font}: {str(e)}")
-                            # 继续尝试下一个回退字体，不中断程序
-                            continue
-                
-                # 4. 最终回退：使用PIL自带的默认字体
-                if font is None:
-                    print("无法加载任何指定字体，使用PIL默认字体作为最终回退")
-                    font = ImageFont.load_default()
-                    # 打印默认字体的信息
-                    print(f"使用默认字体: {font.getname() if hasattr(font, 'getname') else 'Default Font'}")
-            except Exception as e:
-                print(f"字体加载过程中发生严重错误: {str(e)}")
-                # 发生任何异常时，使用默认字体作为最后的保障
-                try:
-                    font = ImageFont.load_default()
-                    print("已回退到默认字体")
-                except:
-                    # 如果连默认字体都加载失败，创建一个简单的字体对象
-                    # 这是最后的安全保障，确保程序不会因字体问题而崩溃
-                    print("警告: 无法加载默认字体，程序可能无法正确显示文本")
-                    # 创建一个功能更完整的DummyFont对象，支持中文文本处理
-                    class DummyFont:
-                        def __init__(self, size=font_size):
-                            self.size = size
-                        def getsize(self, text):
-                            # 估算文本尺寸，确保中文能被正确处理
-                            try:
-                                # 对于中文，每个字符大约占一个半英文字符宽度
-                                width = len(text) * self.size // 2
-                                for char in text:
-                                    if ord(char) > 127:  # 非ASCII字符（如中文）
-                                        width += self.size // 4
-                                return (width, self.size)
-                            except:
-                                return (len(text) * self.size // 2, self.size)
-                        def getname(self):
-                            return ("DummyFont", "Regular")
-                        def getbbox(self, text, *args, **kwargs):
-                            # 实现getbbox方法以避免在处理中文时出错
-                            width, height = self.getsize(text)
-                            return (0, -height // 2, width, height // 2)
-                    font = DummyFont(font_size)
-            
-            # 应用斜体效果（如果需要）
-            if italic:
-                try:
-                    # 首先尝试加载专门的斜体字体文件
-                    italic_font = None
-                    if os.name == 'nt' and font_family in chinese_fonts_map and len(chinese_fonts_map[font_family]) > 2:
-                        italic_font_path = os.path.join(windows_font_dir, chinese_fonts_map[font_family][2])
-                        if os.path.exists(italic_font_path):
-                            italic_font = ImageFont.truetype(italic_font_path, font_size)
-                            font = italic_font
-                            print(f"已加载专门的斜体字体文件: {italic_font_path}")
-                    
-                    # 如果没有专门的斜体字体文件，尝试使用字体变换创建伪斜体效果
-                    if italic_font is None:
-                        # 使用PIL的ImageDraw方法实现伪斜体
-                        # 我们会在绘制文本时应用斜体变换
-                        print("无法加载专门的斜体字体文件，将在绘制时应用伪斜体效果")
-                except Exception as e:
-                    print(f"无法应用斜体效果: {str(e)}")
-                    # 如果变换失败，保持原字体
-                    pass
-            
-            # 获取文本尺寸
-            # 对于斜体文本，我们需要调整计算方式
-            try:
-                if italic:
-                    # 创建一个临时的图像来测量斜体文本的尺寸
-                    temp_img = Image.new('RGBA', (1000, 1000), (255, 255, 255, 0))
-                    temp_draw = ImageDraw.Draw(temp_img)
-                    # 正常文本的尺寸
-                    try:
-                        bbox = temp_draw.textbbox((0, 0), text, font=font)
-                        text_width = bbox[2] - bbox[0]
-                        text_height = bbox[3] - bbox[1]
-                    except UnicodeEncodeError:
-                        print(f"计算斜体文本尺寸时出现编码错误")
-                        # 使用简化方法估算文本尺寸
-                        width_ratio = 1.5 if any(ord(char) > 127 for char in text) else 1.0
-                        text_width = int(len(text) * font_size * 0.5 * width_ratio)
-                        text_height = font_size
-                    except Exception as e:
-                        print(f"计算斜体文本尺寸时出错: {str(e)}")
-                        # 使用简化方法估算文本尺寸
-                        text_width = len(text) * font_size // 2
-                        text_height = font_size
-                    # 斜体文本通常比正常文本宽10-15%
-                    text_width = int(text_width * 1.15)
-                else:
-                    try:
-                        bbox = draw.textbbox((0, 0), text, font=font)
-                        text_width = bbox[2] - bbox[0]
-                        text_height = bbox[3] - bbox[1]
-                    except UnicodeEncodeError:
-                        print(f"计算文本尺寸时出现编码错误")
-                        # 使用简化方法估算文本尺寸
-                        width_ratio = 1.5 if any(ord(char) > 127 for char in text) else 1.0
-                        text_width = int(len(text) * font_size * 0.5 * width_ratio)
-                        text_height = font_size
-                    except Exception as e:
-                        print(f"计算文本尺寸时出错: {str(e)}")
-                        # 使用简化方法估算文本尺寸
-                        text_width = len(text) * font_size // 2
-                        text_height = font_size
-            except Exception as e:
-                print(f"获取文本尺寸时发生严重错误: {str(e)}")
-                # 使用安全的默认值
-                text_width = len(text) * font_size // 2
-                text_height = font_size
-            
-            # 调整水印位置到图片坐标系
-            img_width, img_height = img.size
-            pos_x = int(self.watermark_pos.x() * img_width / (self.preview_label.width() - 20))
-            pos_y = int(self.watermark_pos.y() * img_height / (self.preview_label.height() - 20))
-            
-            # 准备填充颜色
-            fill_color = (r, g, b, int(255 * (100 - transparency) / 100))
-            
-            # 如果启用了描边效果
-            if self.stroke_checkbox.isChecked():
-                # 解析描边颜色
-                stroke_color_code = self.current_stroke_color
-                stroke_r = int(stroke_color_code[1:3], 16)
-                stroke_g = int(stroke_color_code[3:5], 16)
-                stroke_b = int(stroke_color_code[5:7], 16)
-                stroke_width = self.stroke_width.value()
-                
-                # 绘制描边（在文本周围绘制多个偏移的文本）
-                for x_offset in range(-stroke_width, stroke_width + 1):
-                    for y_offset in range(-stroke_width, stroke_width + 1):
-                        if x_offset != 0 or y_offset != 0:  # 避免重复绘制中心文本
-                            draw.text((pos_x + x_offset, pos_y + y_offset), text, font=font, 
-                                     fill=(stroke_r, stroke_g, stroke_b, int(255 * (100 - transparency) / 100)))
-            
-            # 如果启用了阴影效果
-            if self.shadow_checkbox.isChecked():
-                shadow_distance = self.shadow_distance.value()
-                # 绘制阴影
-                draw.text((pos_x + shadow_distance, pos_y + shadow_distance), text, font=font, 
-                         fill=(0, 0, 0, int(128 * (100 - transparency) / 100)))
-            
-            # 绘制主文本
-            try:
-                # 如果需要粗体效果但没有加载到粗体字体文件，手动模拟粗体
-                if bold and self.stroke_checkbox.isChecked() == False:
-                    # 通过在文本周围绘制多个偏移的文本实现伪粗体效果
-                    # 绘制伪粗体（四个方向的偏移文本）
-                    bold_offset = 1
-                    for x_offset in range(-bold_offset, bold_offset + 1):
-                        for y_offset in range(-bold_offset, bold_offset + 1):
-                            if x_offset != 0 or y_offset != 0:  # 避免重复绘制中心文本
-                                try:
-                                    draw.text((pos_x + x_offset, pos_y + y_offset), text, font=font, fill=fill_color)
-                                except:
-                                    pass
-                
-                if italic:
-                    # 应用伪斜体效果（通过变换坐标）
-                    # 使用一个简单的剪切变换来创建斜体效果
-                    try:
-                        # 保存原始文本的边界框
-                        original_bbox = draw.textbbox((pos_x, pos_y), text, font=font)
-                        original_center = ((original_bbox[0] + original_bbox[2]) // 2, 
-                                           (original_bbox[1] + original_bbox[3]) // 2)
-                    except Exception as e:
-                        print(f"计算原始文本边界框时出错: {str(e)}")
-                        # 使用估算的位置
-                        original_center = (pos_x + text_width // 2, pos_y + text_height // 2)
-                    
-                    # 计算斜体变换的系数 (倾斜程度)
-                    shear_factor = 0.2  # 控制斜体倾斜度
-                    
-                    # 创建一个带有alpha通道的新层来绘制斜体文本
-                    italic_layer = Image.new('RGBA', watermark_img.size, (255, 255, 255, 0))
-                    italic_draw = ImageDraw.Draw(italic_layer)
-                    
-                    # 尝试绘制文本，如果失败则处理编码问题
-                    try:
-                        italic_draw.text((pos_x, pos_y), text, font=font, fill=fill_color)
-                    except UnicodeEncodeError:
-                        print(f"绘制斜体文本时出现编码错误，尝试处理文本")
-                        # 尝试处理文本：替换非ASCII字符或使用简化文本
-                        processed_text = "".join([char if ord(char) < 128 else "?" for char in text])
-                        if processed_text:
-                            italic_draw.text((pos_x, pos_y), processed_text, font=font, fill=fill_color)
-                    except Exception as e:
-                        print(f"绘制斜体文本时出错: {str(e)}")
-                        # 如果无法绘制斜体，继续执行
-                        pass
-                    
-                    # 应用剪切变换
-                    # 计算新的尺寸，考虑到剪切后的扩展
-                    new_width = watermark_img.width + int(watermark_img.height * abs(shear_factor))
-                    
-                    # 应用Affine变换来实现斜体效果
-                    try:
-                        italic_layer = italic_layer.transform(
-                            (new_width, watermark_img.height),
-                            Image.AFFINE,
-                            (1, shear_factor, 0, 0, 1, 0),
-                            Image.BICUBIC
-                        )
-                        
-                        # 计算偏移量以保持文本居中
-                        offset_x = int((original_center[0] * shear_factor))
-                        
-                        # 将斜体层粘贴回主图像
-                        watermark_img.paste(
-                            italic_layer, 
-                            (offset_x, 0), 
-                            italic_layer.split()[3]  # 使用alpha通道作为掩码
-                        )
-                    except Exception as e:
-                        print(f"应用斜体变换时出错: {str(e)}")
-                        # 如果变换失败，尝试直接绘制文本作为回退
-                        try:
-                            draw.text((pos_x, pos_y), text, font=font, fill=fill_color)
-                        except:
-                            pass
-                else:
-                    # 正常绘制文本
-                    try:
-                        draw.text((pos_x, pos_y), text, font=font, fill=fill_color)
-                    except UnicodeEncodeError:
-                        print(f"绘制文本时出现编码错误，尝试处理文本")
-                        # 尝试处理文本：替换非ASCII字符或使用简化文本
-                        processed_text = "".join([char if ord(char) < 128 else "?" for char in text])
-                        if processed_text:
-                            draw.text((pos_x, pos_y), processed_text, font=font, fill=fill_color)
-                    except Exception as e:
-                        print(f"绘制文本时出错: {str(e)}")
-                        # 如果无法绘制，继续执行
-                        pass
-            except Exception as e:
-                print(f"绘制主文本时发生严重错误: {str(e)}")
-                # 忽略错误，继续执行
-            
-            # 合并图片
-            result = Image.alpha_composite(img, watermark_img)
-            
-            return result
-        elif self.watermark_type == "image" and self.image_watermark:
-            # 调整水印图片大小
-            img_width, img_height = img.size
-            
-            # 根据选择的调整方式调整水印图片大小
-            resize_method = self.image_resize_method.currentText()
-            new_width = self.image_watermark_width
-            new_height = self.image_watermark_height
-            
-            if resize_method == "按百分比":
-                scale = self.image_watermark_scale / 100
-                new_width = int(self.image_watermark_width * scale)
-                new_height = int(self.image_watermark_height * scale)
-            elif resize_method == "按宽度" and self.image_width_input.text().strip():
-                try:
-                    new_width = int(self.image_width_input.text())
-                    # 保持宽高比
-                    scale = new_width / self.image_watermark_width
-                    new_height = int(self.image_watermark_height * scale)
-                except ValueError:
-                    pass
-            elif resize_method == "按高度" and self.image_height_input.text().strip():
-                try:
-                    new_height = int(self.image_height_input.text())
-                    # 保持宽高比
-                    scale = new_height / self.image_watermark_height
-                    new_width = int(self.image_watermark_width * scale)
-                except ValueError:
-                    pass
-            
-            # 调整水印图片大小
-            resized_watermark = self.image_watermark.resize((new_width, new_height), Image.LANCZOS)
-            
-            # 调整水印透明度
-            transparency = self.image_transparency.value()
-            if transparency < 100:
-                # 使用更高效的方法调整透明度
-                # 首先确保水印图片是RGBA模式
-                if resized_watermark.mode != 'RGBA':
-                    resized_watermark = resized_watermark.convert('RGBA')
-                
-                # 分解图像通道
-                r, g, b, a = resized_watermark.split()
-                # 计算新的透明度
-                new_transparency = int(255 * (100 - transparency) / 100)
-                # 应用新的透明度
-                a = a.point(lambda p: int(p * new_transparency / 255))
-                # 合并通道
-                resized_watermark = Image.merge('RGBA', (r, g, b, a))
-            
-            # 调整水印位置到图片坐标系
-            pos_x = int(self.watermark_pos.x() * img_width / (self.preview_label.width()))
-            pos_y = int(self.watermark_pos.y() * img_height / (self.preview_label.height()))
-            
-            # 确保水印在图片范围内
-            pos_x = max(0, min(pos_x, img_width - new_width))
-            pos_y = max(0, min(pos_y, img_height - new_height))
-            
-            # 将水印粘贴到目标图像上
-            watermark_img.paste(resized_watermark, (pos_x, pos_y), resized_watermark)
-            
-            # 合并图片
-            result = Image.alpha_composite(img, watermark_img)
-            
-            return result
-        
-        # 如果没有水印（文本为空或没有选择图片水印），直接返回原图
-        return img
+            return (self.watermark_pos.x() / (self.preview_label.width() - 20),
+                    self.watermark_pos.y() / (self.preview_label.height() - 20))
+        return (self.watermark_pos.x() / self.preview_label.width(),
+                self.watermark_pos.y() / self.preview_label.height())
+    
+    def watermark_spec(self):
+        # 读取当前控件状态，生成不可变的水印参数快照
+        return WatermarkSpec(
+            watermark_type=self.watermark_type,
+            text=self.watermark_text.text(),
+            font_size=int(self.font_size.currentText()),
+            bold=self.bold_checkbox.isChecked(),
+            font_color=self.current_color,
+            transparency=self.transparency.value(),
+            shadow_enabled=self.shadow_checkbox.isChecked(),
+            shadow_distance=self.shadow_distance.value(),
+            stroke_enabled=self.stroke_checkbox.isChecked(),
+            stroke_width=self.stroke_width.value(),
+            stroke_color=self.current_stroke_color,
+            image_path=self.image_watermark_path if self.image_watermark else "",
+            image_size=self.image_watermark_target_size(),
+            image_transparency=self.image_transparency.value(),
+            anchor=self.watermark_anchor(),
+            tiled=self.tile_checkbox.isChecked(),
+            tile_spacing=self.tile_spacing.value(),
+            tile_angle=self.tile_angle.value(),
+            tile_stagger=self.tile_stagger.isChecked()
+        )
+    
+    def export_options(self):
+        return ExportOptions(
+            output_folder=self.output_folder_path,
+            output_format=self.output_format.currentText(),
+            quality=self.quality_slider.value(),
+            resize_method=self.resize_method.currentText(),
+            width=self.width_input.text(),
+            height=self.height_input.text(),
+            percent=self.percent_slider.value(),
+            preserve_filename=self.preserve_filename.isChecked(),
+            prefix=self.prefix.text() if self.use_prefix else "",
+            suffix=self.suffix.text() if self.use_suffix else "",
+            resize_first=self.resize_first.isChecked()
+        )
+    
+    def add_watermark_to_image(self, img):
+        try:
+            spec = self.watermark_spec()
+        except ValueError:
+            return img.copy()  # 忽略无效输入（例如正在编辑的字体大小），返回原图的副本
+        return render_watermark(img, spec)
     
     def on_preview_mouse_press(self, event):
         if event.button() == Qt.LeftButton and self.current_image_index >= 0:
             self.dragging = True
             self.drag_start = event.pos()
+            
+            # 缓存未加水印的预览底图，拖动过程中只在底图上叠加水印图层
+            img_info = self.images[self.current_image_index]
+            preview_size = self.preview_label.size()
+            base_img = self.preview_renderer.display_image(
+                img_info['path'], img_info['handle'], (preview_size.width(), preview_size.height())
+            )
+            self.drag_base_pixmap = pil_to_pixmap(base_img)
     
     def on_preview_mouse_move(self, event):
         if self.dragging:
@@ -1195,12 +891,39 @@ class WatermarkApp(QMainWindow):
             # 更新拖动起点
             self.drag_start = event.pos()
             
-            # 更新预览
-            self.update_preview()
+            # 只移动水印图层，松开鼠标后再重新合成预览
+            self.update_drag_overlay()
     
     def on_preview_mouse_release(self, event):
-        if event.button() == Qt.LeftButton:
+        if event.button() == Qt.LeftButton and self.dragging:
             self.dragging = False
+            self.drag_base_pixmap = None
+            self.drag_layer = None
+            self.drag_layer_pixmap = None
+            self.update_preview()
+    
+    def update_drag_overlay(self):
+        if self.drag_base_pixmap is None:
+            return
+        
+        img_info = self.images[self.current_image_index]
+        display_size = (self.drag_base_pixmap.width(), self.drag_base_pixmap.height())
+        try:
+            spec = self.watermark_spec().scaled(display_size[0] / img_info['handle'].width)
+        except ValueError:
+            return  # 忽略无效输入（例如正在编辑的字体大小）
+        
+        pixmap = QPixmap(self.drag_base_pixmap)
+        if not spec.is_empty():
+            layer, position = watermark_layer(spec, display_size)
+            # 文本水印图层来自缓存，拖动过程中是同一个对象，只需转换一次
+            if layer is not self.drag_layer:
+                self.drag_layer = layer
+                self.drag_layer_pixmap = pil_to_pixmap(layer)
+            painter = QPainter(pixmap)
+            painter.drawPixmap(QPoint(*position), self.drag_layer_pixmap)
+            painter.end()
+        self.preview_label.setPixmap(pixmap)
     
     def set_watermark_position(self, position):
         if self.current_image_index < 0:
@@ -1268,6 +991,13 @@ class WatermarkApp(QMainWindow):
             self.stroke_color_preview.setStyleSheet(f"background-color: {self.current_stroke_color}; border: 1px solid #ccc;")
             self.update_preview()
             
+    def toggle_tile_options(self):
+        tiled = self.tile_checkbox.isChecked()
+        self.tile_spacing.setEnabled(tiled)
+        self.tile_angle.setEnabled(tiled)
+        self.tile_stagger.setEnabled(tiled)
+        self.update_preview()
+    
     def toggle_filename_options(self, state):
         self.prefix.setEnabled(not state)
         self.suffix.setEnabled(not state)
@@ -1297,6 +1027,7 @@ class WatermarkApp(QMainWindow):
         self.height_input.setEnabled(method == "按高度")
         self.percent_slider.setEnabled(method == "按百分比")
         self.percent_label.setEnabled(method == "按百分比")
+        self.resize_first.setEnabled(method != "原始尺寸")
     
     def export_images(self):
         if not self.images:
@@ -1311,85 +1042,65 @@ class WatermarkApp(QMainWindow):
         # 确保输出文件夹存在
         os.makedirs(self.output_folder_path, exist_ok=True)
         
-        # 导出每张图片
-        for img_info in self.images:
-            try:
-                # 添加水印
-                img = img_info['image'].copy()
-                watermarked_img = self.add_watermark_to_image(img)
-                
-                # 调整图片尺寸
-                resize_method = self.resize_method.currentText()
-                if resize_method != "原始尺寸":
-                    width, height = watermarked_img.size
-                    
-                    if resize_method == "按宽度":
-                        try:
-                            new_width = int(self.width_input.text())
-                            # 保持宽高比
-                            scale = new_width / width
-                            new_height = int(height * scale)
-                            watermarked_img = watermarked_img.resize((new_width, new_height), Image.LANCZOS)
-                        except ValueError:
-                            # 如果输入无效，跳过尺寸调整
-                            pass
-                    elif resize_method == "按高度":
-                        try:
-                            new_height = int(self.height_input.text())
-                            # 保持宽高比
-                            scale = new_height / height
-                            new_width = int(width * scale)
-                            watermarked_img = watermarked_img.resize((new_width, new_height), Image.LANCZOS)
-                        except ValueError:
-                            # 如果输入无效，跳过尺寸调整
-                            pass
-                    elif resize_method == "按百分比":
-                        scale = self.percent_slider.value() / 100
-                        new_width = int(width * scale)
-                        new_height = int(height * scale)
-                        watermarked_img = watermarked_img.resize((new_width, new_height), Image.LANCZOS)
-                
-                # 确定输出文件名
-                original_filename = os.path.basename(img_info['original_path'])
-                base_name, ext = os.path.splitext(original_filename)
-                
-                if self.preserve_filename.isChecked():
-                    output_filename = original_filename
-                else:
-                    prefix = self.prefix.text() if self.use_prefix else ""
-                    suffix = self.suffix.text() if self.use_suffix else ""
-                    output_filename = f"{prefix}{base_name}{suffix}.{self.output_format.currentText().lower()}"
-                
-                # 保存图片
-                output_path = os.path.join(self.output_folder_path, output_filename)
-                
-                # 根据输出格式和设置保存
-                if self.output_format.currentText() == "JPEG":
-                    if watermarked_img.mode == 'RGBA':
-                        watermarked_img = watermarked_img.convert('RGB')
-                    # 使用指定的JPEG质量
-                    quality = self.quality_slider.value()
-                    watermarked_img.save(output_path, quality=quality)
-                else:
-                    # PNG格式直接保存
-                    watermarked_img.save(output_path)
-                
-            except Exception as e:
-                QMessageBox.warning(self, "错误", f"无法导出文件 {original_filename}: {str(e)}")
-                continue
+        # 导出每张图片：在进程池中并行处理，导出任务在后台线程中运行，界面保持响应并显示进度；
+        # 失败的图片汇总后统一报告，取消后正在导出的图片完成即停止
+        if self.export_runner.running:
+            return
+        try:
+            spec = self.watermark_spec()
+        except ValueError:
+            QMessageBox.warning(self, "警告", f"字体大小无效: {self.font_size.currentText()}")
+            return
+        source_paths = [img_info['original_path'] for img_info in self.images]
+        job = ExportJob(source_paths, spec, self.export_options(), self.workers_spin.value())
+        
+        progress = QProgressDialog("正在导出...", "取消", 0, job.total, self)
+        progress.setWindowTitle("导出图片")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        progress.setAutoReset(False)
+        progress.setAutoClose(False)
+        progress.canceled.connect(job.cancel)
+        progress.setValue(0)
+        self.export_progress = progress
         
-        QMessageBox.information(self, "完成", f"所有图片已成功导出到 {self.output_folder_path}")
+        self.export_btn.setEnabled(False)
+        self.export_runner.start(job)
+    
+    def on_export_progress(self, completed, text):
+        # 模态进度对话框的setValue会处理事件，导出结束的信号可能在其中处理并关闭对话框，因此最后调用
+        if self.export_progress is not None:
+            self.export_progress.setLabelText(text)
+            self.export_progress.setValue(completed)
+    
+    def on_export_finished(self, job):
+        # 关闭进度对话框时会发出canceled信号，先断开，避免已完成的导出被标记为取消
+        if self.export_progress is not None:
+            self.export_progress.canceled.disconnect(job.cancel)
+            self.export_progress.close()
+            self.export_progress.deleteLater()
+            self.export_progress = None
+        self.export_btn.setEnabled(True)
+        
+        if job.errors:
+            message = QMessageBox(QMessageBox.Warning, "导出完成", f"部分图片导出失败：{job.summary()}", QMessageBox.Ok, self)
+            message.setDetailedText(job.error_report())
+            message.exec_()
+        elif job.cancelled:
+            QMessageBox.information(self, "已取消", f"导出已取消：{job.summary()}")
+        else:
+            QMessageBox.information(self, "完成", f"所有图片已成功导出到 {self.output_folder_path}\n{job.summary()}")
     
     def save_template(self):
         # 获取当前设置
         template_name, ok = QInputDialog.getText(self, "保存模板", "请输入模板名称:")
         
         if ok and template_name:
-            print(f"尝试保存模板: {template_name}")
+            logger.debug("尝试保存模板: %s", template_name)
             # 确保模板目录存在
-            template_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+            template_dir = TEMPLATE_DIR
             os.makedirs(template_dir, exist_ok=True)
-            print(f"模板目录: {template_dir}")
+            logger.debug("模板目录: %s", template_dir)
             
             # 保存模板设置，包括新添加的高级文本水印设置
             template = {
@@ -1404,34 +1115,47 @@ class WatermarkApp(QMainWindow):
                 'stroke_width': self.stroke_width.value(),
                 'stroke_color': self.current_stroke_color,
                 'position': (self.watermark_pos.x(), self.watermark_pos.y()),
+                'anchor': self.watermark_anchor(),  # 水印在图片中的相对位置，供命令行批处理使用
+                'watermark_type': self.watermark_type,
+                'image_path': self.image_watermark_path,
+                'image_transparency': self.image_transparency.value(),
+                'image_resize_method': self.image_resize_method.currentIndex(),
+                'image_percent': self.image_percent_slider.value(),
+                'image_width_input': self.image_width_input.text(),
+                'image_height_input': self.image_height_input.text(),
+                'tiled': self.tile_checkbox.isChecked(),
+                'tile_spacing': self.tile_spacing.value(),
+                'tile_angle': self.tile_angle.value(),
+                'tile_stagger': self.tile_stagger.isChecked(),
                 'output_format': self.output_format.currentIndex(),
                 'quality': self.quality_slider.value(),  # JPEG质量
                 'resize_method': self.resize_method.currentIndex(),  # 尺寸调整方式
                 'width_input': self.width_input.text(),  # 宽度输入
                 'height_input': self.height_input.text(),  # 高度输入
                 'percent_value': self.percent_slider.value(),  # 百分比值
+                'resize_first': self.resize_first.isChecked(),  # 先缩放再添加水印
                 'preserve_filename': self.preserve_filename.isChecked(),
                 'prefix': self.prefix.text(),
                 'suffix': self.suffix.text()
             }
             
             template_path = os.path.join(template_dir, f"{template_name}.json")
-            print(f"模板文件路径: {template_path}")
-            print(f"模板内容: {template}")
+            logger.debug("模板文件路径: %s", template_path)
+            logger.debug("模板内容: %s", template)
             
             try:
-                print("准备写入模板文件...")
+                logger.debug("准备写入模板文件...")
                 with open(template_path, 'w', encoding='utf-8') as f:
                     json.dump(template, f, ensure_ascii=False, indent=4)
-                print("模板文件写入成功")
+                logger.debug("模板文件写入成功")
                 
                 # 更新模板列表
                 self.load_templates()
                 self.template_list.setCurrentText(template_name)
-                print("模板列表更新成功")
+                logger.debug("模板列表更新成功")
                 
             except Exception as e:
-                print(f"保存模板时出错: {str(e)}")
+                logger.warning("保存模板时出错: %s", e)
                 QMessageBox.warning(self, "错误", f"无法保存模板: {str(e)}")
     
     def load_templates(self):
@@ -1439,7 +1163,7 @@ class WatermarkApp(QMainWindow):
         self.template_list.clear()
         
         # 检查模板目录
-        template_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+        template_dir = TEMPLATE_DIR
         if not os.path.exists(template_dir):
             return
         
@@ -1458,7 +1182,7 @@ class WatermarkApp(QMainWindow):
             return
         
         # 读取模板文件
-        template_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+        template_dir = TEMPLATE_DIR
         template_path = os.path.join(template_dir, f"{template_name}.json")
         
         try:
@@ -1493,12 +1217,32 @@ class WatermarkApp(QMainWindow):
             pos = template.get('position', (100, 100))
             self.watermark_pos = QPoint(*pos)
             
+            # 应用水印类型和图片水印设置
+            if template.get('image_path') and os.path.exists(template['image_path']):
+                self.set_image_watermark(template['image_path'])
+            self.image_transparency.setValue(template.get('image_transparency', 50))
+            self.image_resize_method.setCurrentIndex(template.get('image_resize_method', 0))
+            self.image_percent_slider.setValue(template.get('image_percent', 100))
+            if 'image_width_input' in template:
+                self.image_width_input.setText(template['image_width_input'])
+                self.image_height_input.setText(template['image_height_input'])
+            self.tile_spacing.setValue(template.get('tile_spacing', 100))
+            self.tile_angle.setValue(template.get('tile_angle', 30))
+            self.tile_stagger.setChecked(template.get('tile_stagger', True))
+            self.tile_checkbox.setChecked(template.get('tiled', False))
+            self.toggle_tile_options()
+            if template.get('watermark_type', "text") == "image":
+                self.image_watermark_radio.setChecked(True)
+            else:
+                self.text_watermark_radio.setChecked(True)
+            
             self.output_format.setCurrentIndex(template.get('output_format', 0))
             self.quality_slider.setValue(template.get('quality', 90))  # 加载JPEG质量设置
             self.resize_method.setCurrentIndex(template.get('resize_method', 0))  # 加载尺寸调整方式
             self.width_input.setText(template.get('width_input', ""))  # 加载宽度输入
             self.height_input.setText(template.get('height_input', ""))  # 加载高度输入
             self.percent_slider.setValue(template.get('percent_value', 100))  # 加载百分比值
+            self.resize_first.setChecked(template.get('resize_first', False))
             
             self.preserve_filename.setChecked(template.get('preserve_filename', True))
             self.prefix.setText(template.get('prefix', "wm_"))
@@ -1526,7 +1270,7 @@ class WatermarkApp(QMainWindow):
         
         if reply == QMessageBox.Yes:
             # 删除模板文件
-            template_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+            template_dir = TEMPLATE_DIR
             template_path = os.path.join(template_dir, f"{template_name}.json")
             
             try:
@@ -1560,7 +1304,7 @@ class WatermarkApp(QMainWindow):
                         self.load_template()
                 
             except Exception as e:
-                print(f"无法加载上次设置: {str(e)}")
+                logger.warning("无法加载上次设置: %s", e)
     
     def save_last_settings(self):
         # 保存设置
@@ -1575,7 +1319,7 @@ class WatermarkApp(QMainWindow):
                 json.dump(settings, f, ensure_ascii=False, indent=4)
                 
         except Exception as e:
-            print(f"无法保存设置: {str(e)}")
+            logger.warning("无法保存设置: %s", e)
     
     def show_about(self):
         QMessageBox.about(
@@ -1588,9 +1332,18 @@ class WatermarkApp(QMainWindow):
     def closeEvent(self, event):
         # 保存最后设置
         self.save_last_settings()
+        self.preview_scheduler.shutdown()
+        self.preview_renderer.shutdown()
+        self.thumbnail_loader.shutdown()
+        self.folder_importer.shutdown()
+        self.export_runner.shutdown()
         event.accept()
 
 if __name__ == "__main__":
+    # 打包为可执行文件后，导出子进程需要通过freeze_support启动
+    multiprocessing.freeze_support()
+    # 通过环境变量开启调试日志、分阶段计时或性能分析，见 tracing.py
+    tracing.configure()
     app = QApplication(sys.argv)
     window = WatermarkApp()
     window.show()
@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+
+def image_nbytes(img):
+    # 估算PIL图像占用的内存
+    bands = len(img.getbands())
+    bytes_per_band = 2 if img.mode in ('I;16', 'I;16B', 'I;16L') else 4 if img.mode in ('I', 'F') else 1
+    return img.width * img.height * bands * bytes_per_band
+
+
+class MemoryLRUCache:
+    # 按内存占用限制容量的线程安全LRU缓存，超过预算时淘汰最久未使用的条目
+    # sizeof 用于计算每个值占用的字节数
+
+    def __init__(self, max_bytes, sizeof=image_nbytes):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.current_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return default
+            self._items.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            # 单个条目超过整个预算时不缓存
+            if size > self.max_bytes:
+                return value
+            self._items[key] = (value, size)
+            self.current_bytes += size
+            self._evict()
+        return value
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        # 调用方持有锁
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._items.popitem(last=False)
+            self.current_bytes -= evicted_size
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._items.pop(key, None)
+            if entry is None:
+                return default
+            self.current_bytes -= entry[1]
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
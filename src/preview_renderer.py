@@ -0,0 +1,102 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from memory_cache import MemoryLRUCache
+from watermark_renderer import render_watermark
+from tracing import logger, span
+
+
+# 预览渲染：在按显示尺寸缩小的代理图上添加等比例缩放的水印，
+# 交互延迟与原图分辨率无关；导出仍然使用原图分辨率
+
+# 预览代理图缓存的内存上限
+PROXY_CACHE_BYTES = 256 * 1024 * 1024
+# 切换图片时在后台预先生成前后各几张图片的代理图
+PREFETCH_NEIGHBORS = 2
+
+
+def fit_size(image_size, box_size):
+    # 计算完全放入显示区域的缩放比例和尺寸（允许放大）
+    img_width, img_height = image_size
+    box_width, box_height = box_size
+    scale = min(box_width / img_width, box_height / img_height)
+    return scale, (max(1, int(img_width * scale)), max(1, int(img_height * scale)))
+
+
+def make_proxy(img, display_size):
+    # 大图缩小到显示尺寸；比显示区域小的图片保持原样，在添加水印后再放大
+    scale, size = fit_size(img.size, display_size)
+    if scale >= 1:
+        return img.copy()
+    # reducing_gap 先用整数倍缩小快速降采样，再做精确缩放
+    return img.resize(size, Image.BICUBIC, reducing_gap=3.0)
+
+
+class PreviewRenderer:
+    # 可以在后台线程中调用；handle 是 ImageHandle，只有代理图不在缓存中时才解码原图
+    # 同一代理图只生成一次，不同图片的代理图可以同时生成
+    # 最近查看过的图片的代理图保留在缓存中，并在后台预先生成相邻图片的代理图
+
+    def __init__(self, max_bytes=PROXY_CACHE_BYTES):
+        self._proxies = MemoryLRUCache(max_bytes)
+        self._locks = [threading.Lock() for _ in range(16)]
+        self._prefetch_generation = 0
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=1)
+
+    def proxy(self, key, handle, display_size):
+        # key 用于标识原图（例如文件路径），同一张图片在同一显示尺寸下只缩小一次
+        cache_key = (key, tuple(display_size))
+        proxy = self._proxies.get(cache_key)
+        if proxy is None:
+            with self._locks[hash(cache_key) % len(self._locks)]:
+                proxy = self._proxies.get(cache_key)
+                if proxy is None:
+                    _, size = fit_size(handle.size, display_size)
+                    with span("proxy", path=key):
+                        proxy = self._proxies.put(cache_key, make_proxy(handle.load_reduced(size), display_size))
+        return proxy
+
+    def display_image(self, key, handle, display_size):
+        # 未添加水印、与预览显示尺寸一致的图片，拖动水印时作为底图
+        proxy = self.proxy(key, handle, display_size)
+        _, size = fit_size(handle.size, display_size)
+        if proxy.size != size:
+            proxy = proxy.resize(size)
+        return proxy
+
+    def render(self, key, handle, spec, display_size):
+        with span("preview", path=key):
+            return self._render(key, handle, spec, display_size)
+
+    def _render(self, key, handle, spec, display_size):
+        proxy = self.proxy(key, handle, display_size)
+        # 水印几何尺寸按代理图与原图的比例缩放
+        watermarked = render_watermark(proxy, spec.scaled(proxy.width / handle.width))
+
+        _, size = fit_size(handle.size, display_size)
+        if watermarked.size != size:
+            watermarked = watermarked.resize(size)
+        return watermarked
+
+    def prefetch(self, items, display_size):
+        # items：[(key, handle)]，按优先级排列；新的预取请求会取消尚未开始的旧请求
+        self._prefetch_generation += 1
+        for key, handle in items:
+            self._prefetch_executor.submit(self._prefetch, self._prefetch_generation, key, handle, display_size)
+
+    def _prefetch(self, generation, key, handle, display_size):
+        # 在后台线程中执行
+        if generation != self._prefetch_generation:
+            return
+        try:
+            self.proxy(key, handle, display_size)
+        except Exception as e:
+            logger.warning("预取预览失败 %s: %s", key, e)
+
+    def clear(self):
+        self._proxies.clear()
+
+    def shutdown(self):
+        self._prefetch_generation += 1
+        self._prefetch_executor.shutdown(wait=False)
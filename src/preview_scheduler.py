@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from tracing import logger
+
+
+class PreviewScheduler(QObject):
+    # 预览调度：合并短时间内的多次刷新请求，在后台线程中渲染，只显示最新参数的结果
+    # - 请求在 delay_ms 内没有新的请求时才开始渲染（防抖）
+    # - 同一时间最多只有一个渲染在进行，期间到来的请求只保留最新的一个
+    # - 过期的请求在开始前被丢弃，过期的渲染结果不会显示
+
+    # 渲染完成，参数为PIL图像，在GUI线程中发出
+    rendered = pyqtSignal(object)
+    # 后台线程通知GUI线程渲染结束：(请求序号, 图像或None, 异常或None)
+    _finished = pyqtSignal(int, object, object)
+
+    def __init__(self, render_func, delay_ms=30, parent=None):
+        super().__init__(parent)
+        self.render_func = render_func
+        self.generation = 0
+        self._pending = None
+        self._busy = False
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self._start_pending)
+        self._finished.connect(self._on_finished)
+
+    def request(self, *args):
+        # args 必须是不会被界面修改的快照（例如WatermarkSpec），会在后台线程中使用
+        self.generation += 1
+        self._pending = (self.generation, args)
+        self._timer.start()
+
+    def cancel(self):
+        # 作废所有尚未显示的请求
+        self.generation += 1
+        self._pending = None
+        self._timer.stop()
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _start_pending(self):
+        if self._pending is None or self._busy:
+            return
+        generation, args = self._pending
+        self._pending = None
+        self._busy = True
+        self._executor.submit(self._render, generation, args)
+
+    def _render(self, generation, args):
+        # 在后台线程中执行
+        if generation != self.generation:
+            self._finished.emit(generation, None, None)
+            return
+        try:
+            self._finished.emit(generation, self.render_func(*args), None)
+        except Exception as e:
+            self._finished.emit(generation, None, e)
+
+    def _on_finished(self, generation, image, error):
+        self._busy = False
+        if error is not None:
+            logger.warning("渲染预览失败: %s", error)
+        elif image is not None and generation == self.generation:
+            self.rendered.emit(image)
+        # 渲染期间有新的请求，立即开始渲染最新的一个
+        if self._pending is not None and not self._timer.isActive():
+            self._start_pending()
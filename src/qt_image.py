@@ -0,0 +1,14 @@
+from PyQt5.QtGui import QPixmap, QImage
+
+
+def pil_to_pixmap(img):
+    # 将PIL图像转换为QPixmap
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    if img.mode == 'RGBA':
+        data = img.tobytes("raw", "RGBA")
+        q_image = QImage(data, img.width, img.height, QImage.Format_RGBA8888)
+    else:
+        data = img.tobytes("raw", "RGBX")
+        q_image = QImage(data, img.width, img.height, QImage.Format_RGBX8888)
+    return QPixmap.fromImage(q_image)
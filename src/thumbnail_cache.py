@@ -0,0 +1,146 @@
+import os
+import sys
+import hashlib
+import threading
+from PIL import Image, features
+
+from tracing import logger
+
+
+# 磁盘缩略图缓存：每张缩略图保存为缓存目录中的一个小文件，
+# 文件名由 (绝对路径, 修改时间, 文件大小, 缩略图尺寸) 计算得到，原图被修改后自动失效
+# 缓存总大小超过上限时，按最近使用时间（缓存文件的修改时间）淘汰最久未使用的文件
+
+THUMBNAIL_CACHE_BYTES = 256 * 1024 * 1024
+# 超过上限时一次淘汰到上限的这个比例，避免每次写入都触发淘汰
+EVICT_TARGET_RATIO = 0.9
+
+if features.check('webp'):
+    CACHE_FORMAT, CACHE_EXTENSION = 'WEBP', '.webp'
+else:
+    CACHE_FORMAT, CACHE_EXTENSION = 'PNG', '.png'
+
+
+def default_cache_dir():
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    elif sys.platform == 'darwin':
+        base = os.path.join(os.path.expanduser('~'), 'Library', 'Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'photowatermark', 'thumbnails')
+
+
+def cache_key(path, size):
+    # 原图不存在时抛出OSError
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = f"{path}\0{stat.st_mtime_ns}\0{stat.st_size}\0{size[0]}x{size[1]}"
+    return hashlib.sha1(key.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+class ThumbnailCache:
+    # 线程安全，可以在缩略图线程池中直接调用
+
+    def __init__(self, cache_dir=None, max_bytes=THUMBNAIL_CACHE_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = None  # 缓存文件名 → (文件大小, 最近使用时间)，第一次使用时扫描目录
+        self._lock = threading.Lock()
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_EXTENSION)
+
+    def _load_index(self):
+        # 调用方持有锁
+        if self._entries is not None:
+            return
+        self._entries = {}
+        self.current_bytes = 0
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith(CACHE_EXTENSION):
+                        stat = entry.stat()
+                        self._entries[entry.name] = (stat.st_size, stat.st_mtime)
+                        self.current_bytes += stat.st_size
+        except OSError as e:
+            logger.warning("无法读取缩略图缓存目录 %s: %s", self.cache_dir, e)
+
+    def get(self, path, size):
+        try:
+            key = cache_key(path, size)
+        except OSError:
+            return None
+        cache_path = self._cache_path(key)
+        try:
+            with Image.open(cache_path) as img:
+                img.load()
+                thumbnail = img
+        except Exception:
+            return None
+
+        # 更新文件修改时间作为最近使用时间，重启后仍能按LRU淘汰
+        with self._lock:
+            self._load_index()
+            name = os.path.basename(cache_path)
+            if name in self._entries:
+                try:
+                    os.utime(cache_path)
+                    self._entries[name] = (self._entries[name][0], os.path.getmtime(cache_path))
+                except OSError:
+                    pass
+        return thumbnail
+
+    def put(self, path, size, thumbnail):
+        try:
+            key = cache_key(path, size)
+        except OSError:
+            return
+        cache_path = self._cache_path(key)
+        # 先写临时文件再替换，其他线程或进程不会读到写了一半的文件
+        temp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            thumbnail.save(temp_path, CACHE_FORMAT)
+            os.replace(temp_path, cache_path)
+            stat = os.stat(cache_path)
+        except Exception as e:
+            logger.warning("无法写入缩略图缓存: %s", e)
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._load_index()
+            name = os.path.basename(cache_path)
+            old = self._entries.pop(name, None)
+            if old is not None:
+                self.current_bytes -= old[0]
+            self._entries[name] = (stat.st_size, stat.st_mtime)
+            self.current_bytes += stat.st_size
+            if self.current_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * EVICT_TARGET_RATIO))
+
+    def _evict(self, target_bytes):
+        # 调用方持有锁
+        for name, (file_size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self.current_bytes <= target_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            del self._entries[name]
+            self.current_bytes -= file_size
+
+    def clear(self):
+        with self._lock:
+            self._load_index()
+            self._evict(0)
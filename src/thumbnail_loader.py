@@ -0,0 +1,98 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from thumbnails import THUMBNAIL_SIZE, make_thumbnail
+
+
+# 等待生成的缩略图数量上限，超过时丢弃最早的请求（通常已经滚动出可见区域）
+MAX_PENDING_THUMBNAILS = 256
+
+
+def default_thumbnail_workers():
+    # 解码主要在Pillow的C代码中进行，会释放GIL，线程池即可并行
+    return max(1, min(8, os.cpu_count() or 1))
+
+
+class ThumbnailLoader(QObject):
+    # 在后台线程池中生成缩略图，每完成一张就在GUI线程中发出信号，界面不会被导入过程阻塞
+    # 最新的请求最先处理：列表滚动时优先生成当前可见的缩略图；
+    # 重复请求同一个文件（排队中或正在生成）会被忽略，被丢弃的请求可以再次提交
+
+    # 缩略图生成完成：(文件路径, PIL图像)
+    loaded = pyqtSignal(str, object)
+    # 缩略图生成失败：(文件路径, 异常)
+    failed = pyqtSignal(str, object)
+    # 后台线程通知GUI线程：(批次序号, 文件路径, 图像或None, 异常或None)
+    _finished = pyqtSignal(int, str, object, object)
+
+    def __init__(self, size=THUMBNAIL_SIZE, max_workers=None, cache=None,
+                 max_pending=MAX_PENDING_THUMBNAILS, parent=None):
+        super().__init__(parent)
+        self.size = size
+        # 可选的磁盘缓存（ThumbnailCache），命中时不再解码原图
+        self.cache = cache
+        self.max_pending = max_pending
+        self.generation = 0
+        self._queue = deque()
+        self._queued = set()
+        self._loading = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or default_thumbnail_workers())
+        self._finished.connect(self._on_finished)
+
+    def request(self, paths):
+        added = 0
+        with self._lock:
+            for path in paths:
+                if path in self._queued or path in self._loading:
+                    continue
+                self._queue.append(path)
+                self._queued.add(path)
+                added += 1
+            while len(self._queue) > self.max_pending:
+                self._queued.discard(self._queue.popleft())
+        for _ in range(added):
+            self._executor.submit(self._load_next, self.generation)
+
+    def cancel(self):
+        # 丢弃尚未完成的缩略图（例如清空了文件列表）
+        with self._lock:
+            self.generation += 1
+            self._queue.clear()
+            self._queued.clear()
+            self._loading.clear()
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _load_next(self, generation):
+        # 在后台线程中执行；任务数可能多于队列长度（请求被丢弃），多出的任务直接返回
+        with self._lock:
+            if generation != self.generation or not self._queue:
+                return
+            path = self._queue.pop()
+            self._queued.discard(path)
+            self._loading.add(path)
+        try:
+            thumbnail = self.cache.get(path, self.size) if self.cache is not None else None
+            if thumbnail is None:
+                thumbnail = make_thumbnail(path, self.size)
+                if self.cache is not None:
+                    self.cache.put(path, self.size, thumbnail)
+            self._finished.emit(generation, path, thumbnail, None)
+        except Exception as e:
+            self._finished.emit(generation, path, None, e)
+
+    def _on_finished(self, generation, path, image, error):
+        if generation != self.generation:
+            return
+        with self._lock:
+            self._loading.discard(path)
+        if error is not None:
+            self.failed.emit(path, error)
+        else:
+            self.loaded.emit(path, image)
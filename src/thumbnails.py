@@ -0,0 +1,64 @@
+import io
+from PIL import Image, ExifTags
+
+from tracing import span
+
+
+# 文件列表缩略图：不完整解码原图
+# - JPEG优先使用相机写入的EXIF内嵌缩略图，只需读取文件头
+# - 否则用 draft 让解码器按1/2、1/4、1/8直接缩小解码（DCT缩放），其他格式用 reduce 按整数倍降采样
+
+THUMBNAIL_SIZE = (200, 200)
+
+# EXIF缩略图的最长边至少为目标尺寸的这个比例才使用，避免放大后模糊
+MIN_EXIF_THUMBNAIL_RATIO = 0.5
+# EXIF缩略图与原图宽高比的最大偏差，超过时说明缩略图带黑边或已裁剪
+MAX_EXIF_ASPECT_ERROR = 0.02
+
+# IFD1中内嵌JPEG缩略图的偏移和长度
+JPEG_INTERCHANGE_FORMAT = 0x0201
+JPEG_INTERCHANGE_FORMAT_LENGTH = 0x0202
+
+
+def exif_thumbnail(img, size=THUMBNAIL_SIZE):
+    # 读取JPEG的EXIF内嵌缩略图，不可用时返回None
+    exif_data = img.info.get('exif')
+    if not exif_data or not exif_data.startswith(b'Exif\x00\x00'):
+        return None
+    try:
+        ifd1 = img.getexif().get_ifd(ExifTags.IFD.IFD1)
+        offset = ifd1.get(JPEG_INTERCHANGE_FORMAT)
+        length = ifd1.get(JPEG_INTERCHANGE_FORMAT_LENGTH)
+        if not offset or not length:
+            return None
+        # 偏移量相对于 "Exif\0\0" 之后的TIFF头
+        data = exif_data[6 + offset:6 + offset + length]
+        thumbnail = Image.open(io.BytesIO(data))
+        thumbnail.load()
+    except Exception:
+        return None
+
+    if max(thumbnail.size) < max(size) * MIN_EXIF_THUMBNAIL_RATIO:
+        return None
+    image_aspect = img.width / img.height
+    thumbnail_aspect = thumbnail.width / thumbnail.height
+    if abs(thumbnail_aspect - image_aspect) > image_aspect * MAX_EXIF_ASPECT_ERROR:
+        return None
+    return thumbnail
+
+
+def make_thumbnail(path, size=THUMBNAIL_SIZE):
+    # 可以在后台线程中调用：每次都打开新的文件句柄，不与界面共享图像对象
+    # 返回RGB或RGBA图像，可以直接转换为QPixmap
+    with span("thumbnail", path=path), Image.open(path) as img:
+        thumbnail = exif_thumbnail(img, size) if img.format == 'JPEG' else None
+        if thumbnail is None:
+            # thumbnail() 内部先调用 draft，再用 reduce 快速降采样到目标尺寸附近，最后精确缩放
+            img.thumbnail(size)
+            thumbnail = img
+        else:
+            thumbnail.thumbnail(size)
+
+        if thumbnail.mode in ('RGBA', 'LA', 'PA') or (thumbnail.mode == 'P' and 'transparency' in thumbnail.info):
+            return thumbnail.convert('RGBA')
+        return thumbnail.convert('RGB')
@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import threading
+import cProfile
+import pstats
+
+
+# 性能诊断：分级日志、分阶段计时（Chrome trace格式）和cProfile
+# - 日志使用标准库logging，默认只输出警告以上级别；调试日志使用 %s 参数，关闭时不格式化字符串
+# - span() 在未开启跟踪时返回共享的空上下文，几乎没有开销
+# - 通过环境变量或命令行参数开启，程序退出时写出结果：
+#     PHOTOWATERMARK_LOG_LEVEL=DEBUG        输出调试日志
+#     PHOTOWATERMARK_TRACE=trace.json       记录各阶段耗时，可在 chrome://tracing 或 Perfetto 中查看
+#     PHOTOWATERMARK_PROFILE=profile.prof   cProfile统计，扩展名为 .txt 时输出文本报告
+
+logger = logging.getLogger("photowatermark")
+
+_trace_lock = threading.Lock()
+_trace_events = []
+_trace_enabled = False
+
+_profiles = []
+_profile_lock = threading.Lock()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        event = {
+            'name': self.name,
+            'ph': 'X',
+            # perf_counter 是系统范围的单调时钟，不同进程的时间戳可以直接对齐
+            'ts': self.start * 1e6,
+            'dur': (end - self.start) * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+        }
+        if self.args:
+            event['args'] = self.args
+        with _trace_lock:
+            _trace_events.append(event)
+        return False
+
+
+def span(name, **args):
+    # 用法：with span("decode", path=path): ...
+    if not _trace_enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def is_tracing():
+    return _trace_enabled
+
+
+def enable_tracing(enabled=True):
+    global _trace_enabled
+    _trace_enabled = enabled
+
+
+def drain_events():
+    # 取出并清空已记录的事件，子进程用它把事件交给主进程
+    global _trace_events
+    with _trace_lock:
+        events, _trace_events = _trace_events, []
+    return events
+
+
+def add_events(events):
+    # 合并其他进程记录的事件，按进程分别显示
+    with _trace_lock:
+        _trace_events.extend(events)
+
+
+def run_traced(func, *args):
+    # 在子进程中开启跟踪执行 func，返回 (结果, 事件列表)
+    enable_tracing()
+    drain_events()
+    result = func(*args)
+    return result, drain_events()
+
+
+def dump_trace(path):
+    events = drain_events()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    logger.info("已写出跟踪数据 %s（%d 个事件）", path, len(events))
+
+
+def _start_thread_profile(frame, event, arg):
+    # 新线程第一次调用函数时为该线程创建独立的cProfile（cProfile只统计开启它的线程）
+    sys.setprofile(None)
+    profile = cProfile.Profile()
+    with _profile_lock:
+        _profiles.append(profile)
+    profile.enable()
+
+
+def enable_profiling():
+    # 统计当前线程和之后创建的所有线程；需要在创建线程池之前调用
+    threading.setprofile(_start_thread_profile)
+    profile = cProfile.Profile()
+    with _profile_lock:
+        _profiles.append(profile)
+    profile.enable()
+
+
+def dump_profile(path):
+    threading.setprofile(None)
+    with _profile_lock:
+        profiles = list(_profiles)
+        _profiles.clear()
+    if not profiles:
+        return
+    profiles[0].disable()
+    stats = pstats.Stats(*profiles)
+    if path.endswith('.txt'):
+        with open(path, 'w', encoding='utf-8') as f:
+            stats.stream = f
+            stats.sort_stats('cumulative').print_stats(80)
+    else:
+        stats.dump_stats(path)
+    logger.info("已写出性能分析数据 %s", path)
+
+
+def configure(log_level=None, trace_path=None, profile_path=None):
+    # 命令行参数优先，未指定时读取环境变量；跟踪和性能分析结果在程序退出时写出
+    log_level = log_level or os.environ.get('PHOTOWATERMARK_LOG_LEVEL')
+    trace_path = trace_path or os.environ.get('PHOTOWATERMARK_TRACE')
+    profile_path = profile_path or os.environ.get('PHOTOWATERMARK_PROFILE')
+
+    if (trace_path or profile_path) and not log_level:
+        log_level = 'INFO'
+    if log_level:
+        logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+        logger.setLevel(log_level.upper())
+    if trace_path:
+        enable_tracing()
+        atexit.register(dump_trace, trace_path)
+    if profile_path:
+        enable_profiling()
+        atexit.register(dump_profile, profile_path)
@@ -0,0 +1,325 @@
+import os
+from dataclasses import replace
+from functools import lru_cache
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+
+from watermark_spec import parse_color
+from font_resolver import get_font
+from memory_cache import MemoryLRUCache, image_nbytes
+from tracing import logger, span
+
+
+# 水印渲染核心：不依赖任何Qt控件，输入为 (PIL.Image, WatermarkSpec)
+# 可以在导出子进程、命令行批处理或性能测试中直接调用
+
+
+# 文本水印图层缓存的内存上限
+TEXT_LAYER_CACHE_BYTES = 64 * 1024 * 1024
+
+_text_layer_cache = MemoryLRUCache(TEXT_LAYER_CACHE_BYTES, sizeof=lambda text_layer: image_nbytes(text_layer[0]))
+
+
+# 图片水印图层（已调整大小和透明度的水印图片）缓存的内存上限
+IMAGE_LAYER_CACHE_BYTES = 64 * 1024 * 1024
+# 图片水印的缩放算法
+IMAGE_WATERMARK_RESAMPLE = Image.LANCZOS
+# 水印图片的最长边超过这个值时生成逐级缩小一半的多级图像（mipmap），缩放时从合适的级别开始
+MIPMAP_MIN_SIZE = 1024
+# 只使用宽高都不小于目标尺寸这个倍数的级别。级别离目标尺寸太近时，逐级缩小的误差会保留到结果中
+# （间隔为3时噪点和细线条的水印图片合成后与直接从原图缩放相差可达13）；间隔为8时实测差值不超过3，
+# 测试中按每通道不超过4检查
+MIPMAP_GAP = 8
+
+_image_layer_cache = MemoryLRUCache(IMAGE_LAYER_CACHE_BYTES)
+
+# 平铺水印：旋转后的图块和铺满整张图片的图层的缓存上限；
+# 同一批次中尺寸相同的图片复用同一个整图图层
+TILE_BLOCK_CACHE_BYTES = 32 * 1024 * 1024
+TILE_PATTERN_CACHE_BYTES = 128 * 1024 * 1024
+# 旋转水印图块的插值算法
+TILE_RESAMPLE = Image.BICUBIC
+
+_tile_block_cache = MemoryLRUCache(TILE_BLOCK_CACHE_BYTES, sizeof=lambda block: image_nbytes(block[0]))
+_tile_pattern_cache = MemoryLRUCache(TILE_PATTERN_CACHE_BYTES)
+
+
+def image_source_key(path):
+    # 水印图片的标识：文件被修改后缓存自动失效
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return path, None, None
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+@lru_cache(maxsize=4)
+def load_image_levels(source_key):
+    # 返回 [原图, 1/2, 1/4, ...]，逐级缩小到最长边不超过 MIPMAP_MIN_SIZE；原图较小时只有一级
+    levels = [Image.open(source_key[0]).convert('RGBA')]
+    while max(levels[-1].size) > MIPMAP_MIN_SIZE:
+        levels.append(levels[-1].reduce(2))
+    return levels
+
+
+def load_image_watermark(path):
+    return load_image_levels(image_source_key(path))[0]
+
+
+def mipmap_level(levels, size):
+    # 选择宽高都不小于目标尺寸 MIPMAP_GAP 倍的最小级别，都不满足时使用原图
+    width, height = size
+    for level in reversed(levels[1:]):
+        if level.width >= width * MIPMAP_GAP and level.height >= height * MIPMAP_GAP:
+            return level
+    return levels[0]
+
+
+@lru_cache(maxsize=None)
+def alpha_lut(transparency):
+    # 透明度调整的查找表，对 point() 来说与逐值调用函数生成的表相同
+    new_transparency = int(255 * (100 - transparency) / 100)
+    return [int(p * new_transparency / 255) for p in range(256)]
+
+
+def dilate_mask(mask, radius):
+    # 方形结构元素的形态学膨胀，效果等同于把文字在 (2r+1)x(2r+1) 范围内逐像素平移叠加
+    # 重复r次3x3最大值滤波，耗时只随半径线性增长
+    for _ in range(radius):
+        mask = mask.filter(ImageFilter.MaxFilter(3))
+    return mask
+
+
+def draw_text_layer(spec):
+    # 将文本水印（含描边、阴影和伪粗体）绘制到一个刚好容纳文字的小图层上
+    # 返回 (图层, 图层左上角相对于水印位置的偏移)
+    text = spec.text
+    font = get_font(spec.font_family, spec.font_size, spec.bold)
+    with span("text_layout"):
+        try:
+            left, top, right, bottom = font.getbbox(text)
+        except UnicodeEncodeError:
+            logger.warning("绘制文本时出现编码错误，尝试处理文本")
+            # 尝试处理文本：替换非ASCII字符
+            text = "".join([char if ord(char) < 128 else "?" for char in text])
+            left, top, right, bottom = font.getbbox(text)
+
+    # 为描边、阴影和伪粗体预留边距
+    margin = 1
+    if spec.stroke_enabled:
+        margin += spec.stroke_width
+    if spec.shadow_enabled:
+        margin += spec.shadow_distance
+
+    size = (right - left + 2 * margin, bottom - top + 2 * margin)
+    pos_x, pos_y = margin - left, margin - top
+
+    # 文字只光栅化一次，描边、阴影和伪粗体都由这张遮罩派生
+    with span("text_layout"):
+        mask = Image.new('L', size, 0)
+        ImageDraw.Draw(mask).text((pos_x, pos_y), text, font=font, fill=255)
+
+    with span("effects", stroke=spec.stroke_enabled, shadow=spec.shadow_enabled):
+        layer = Image.new('RGBA', size, (255, 255, 255, 0))
+        transparency = spec.transparency
+        r, g, b = parse_color(spec.font_color)
+
+        # 准备填充颜色
+        fill_color = (r, g, b, int(255 * (100 - transparency) / 100))
+
+        # 如果启用了描边效果：将文字遮罩膨胀描边宽度后填充描边颜色
+        if spec.stroke_enabled:
+            stroke_r, stroke_g, stroke_b = parse_color(spec.stroke_color)
+            layer.paste((stroke_r, stroke_g, stroke_b, int(255 * (100 - transparency) / 100)), (0, 0),
+                        dilate_mask(mask, spec.stroke_width))
+
+        # 如果启用了阴影效果：平移文字遮罩
+        if spec.shadow_enabled:
+            shadow_distance = spec.shadow_distance
+            layer.paste((0, 0, 0, int(128 * (100 - transparency) / 100)), (shadow_distance, shadow_distance), mask)
+
+        # 如果需要粗体效果，将文字遮罩膨胀1像素模拟粗体
+        if spec.bold and not spec.stroke_enabled:
+            layer.paste(fill_color, (0, 0), dilate_mask(mask, 1))
+
+        # 绘制主文本
+        layer.paste(fill_color, (0, 0), mask)
+
+    return layer, (left - margin, top - margin)
+
+
+def get_text_layer(spec):
+    # 文本图层只取决于文本相关参数，与水印位置、平铺方式和图片大小无关，
+    # 同一批次中的图片（以及拖动水印时的预览）可以复用同一个图层
+    key = replace(spec, anchor=(0.0, 0.0), tiled=False, tile_spacing=0, tile_angle=0, tile_stagger=False)
+    text_layer = _text_layer_cache.get(key)
+    if text_layer is None:
+        text_layer = _text_layer_cache.put(key, draw_text_layer(spec))
+    return text_layer
+
+
+def image_watermark_layer(spec):
+    # 生成图片水印图层（已调整大小和透明度）
+    # 图层只取决于水印图片、目标大小、透明度和缩放算法，预览和批量导出中的每张图片复用同一个图层
+    key = (image_source_key(spec.image_path), spec.image_size, spec.image_transparency, IMAGE_WATERMARK_RESAMPLE)
+    layer = _image_layer_cache.get(key)
+    if layer is None:
+        with span("image_watermark", size=spec.image_size):
+            layer = _image_layer_cache.put(key, _image_watermark_layer(key[0], spec))
+    return layer
+
+
+def _image_watermark_layer(source_key, spec):
+    levels = load_image_levels(source_key)
+
+    # 调整水印图片大小；很大的水印图片从尺寸合适的缩小级别开始缩放
+    resized_watermark = mipmap_level(levels, spec.image_size).resize(spec.image_size, IMAGE_WATERMARK_RESAMPLE)
+
+    # 调整水印透明度
+    transparency = spec.image_transparency
+    if transparency < 100:
+        # 分解图像通道
+        r, g, b, a = resized_watermark.split()
+        # 按查找表计算新的透明度
+        a = a.point(alpha_lut(transparency))
+        resized_watermark = Image.merge('RGBA', (r, g, b, a))
+
+    # 以自身alpha为遮罩粘贴到透明图层上，与整图水印层的合成结果保持一致
+    layer = Image.new('RGBA', resized_watermark.size, (255, 255, 255, 0))
+    layer.paste(resized_watermark, (0, 0), resized_watermark)
+    return layer
+
+
+def tile_block(spec):
+    # 返回 (图块, 图块左上角相对于水印位置的偏移)：旋转后的水印加上间距构成一个单元，
+    # 隔行错开时图块包含上下两行，第二行右移半个单元（超出的部分绕回左侧）
+    # 图块只取决于水印本身和平铺参数，与水印位置和图片大小无关
+    key = replace(spec, anchor=(0.0, 0.0))
+    block = _tile_block_cache.get(key)
+    if block is not None:
+        return block
+
+    if spec.watermark_type == "text":
+        tile, offset = get_text_layer(spec)
+    else:
+        tile, offset = image_watermark_layer(spec), (0, 0)
+
+    with span("tile_block", angle=spec.tile_angle):
+        if spec.tile_angle % 360:
+            # 在预乘alpha下旋转，透明边缘不会混入背景颜色；旋转后保持水印中心不动
+            rotated = tile.convert('RGBa').rotate(spec.tile_angle, TILE_RESAMPLE, expand=True).convert('RGBA')
+            offset = (offset[0] - (rotated.width - tile.width) // 2, offset[1] - (rotated.height - tile.height) // 2)
+            tile = rotated
+
+        spacing = max(0, spec.tile_spacing)
+        cell_width, cell_height = tile.width + spacing, tile.height + spacing
+        if spec.tile_stagger:
+            block_image = Image.new('RGBA', (cell_width, 2 * cell_height), (255, 255, 255, 0))
+            block_image.paste(tile, (0, 0))
+            block_image.paste(tile, (cell_width // 2, cell_height))
+            block_image.paste(tile, (cell_width // 2 - cell_width, cell_height))
+        else:
+            block_image = Image.new('RGBA', (cell_width, cell_height), (255, 255, 255, 0))
+            block_image.paste(tile, (0, 0))
+
+    return _tile_block_cache.put(key, (block_image, offset))
+
+
+def tile_pattern(spec, image_size, origin):
+    # 铺满整张图片的平铺图层，网格经过 origin；只粘贴 log2(图块数) 次，耗时与图块数量基本无关
+    block, _ = tile_block(spec)
+    phase = (origin[0] % block.width, origin[1] % block.height)
+    key = (replace(spec, anchor=(0.0, 0.0)), phase, image_size)
+    pattern = _tile_pattern_cache.get(key)
+    if pattern is not None:
+        return pattern
+
+    with span("tile_pattern", size=image_size):
+        width, height = image_size
+        # 循环平移图块，使图块的左上角对齐图片左上角
+        shifted = ImageChops.offset(block, *phase)
+        pattern = Image.new('RGBA', image_size, (255, 255, 255, 0))
+        pattern.paste(shifted, (0, 0))
+        # 先复制出第一行，再复制已填好的行，每次填充的范围翻倍
+        filled = shifted.width
+        while filled < width:
+            pattern.paste(pattern.crop((0, 0, filled, shifted.height)), (filled, 0))
+            filled *= 2
+        filled = shifted.height
+        while filled < height:
+            pattern.paste(pattern.crop((0, 0, width, filled)), (0, filled))
+            filled *= 2
+
+    return _tile_pattern_cache.put(key, pattern)
+
+
+def watermark_layer(spec, image_size):
+    # 返回 (水印图层, 图层在图片中的左上角位置)
+    img_width, img_height = image_size
+    # 水印位置换算到图片坐标系
+    pos_x, pos_y = spec.anchor_position(image_size)
+
+    if spec.tiled:
+        _, (offset_x, offset_y) = tile_block(spec)
+        return tile_pattern(spec, image_size, (pos_x + offset_x, pos_y + offset_y)), (0, 0)
+
+    if spec.watermark_type == "text":
+        layer, (offset_x, offset_y) = get_text_layer(spec)
+        return layer, (pos_x + offset_x, pos_y + offset_y)
+
+    layer = image_watermark_layer(spec)
+    # 确保水印在图片范围内
+    pos_x = max(0, min(pos_x, img_width - layer.width))
+    pos_y = max(0, min(pos_y, img_height - layer.height))
+    return layer, (pos_x, pos_y)
+
+
+def composite_layer(img, layer, position, source=None):
+    # 只在图层覆盖的区域内进行alpha合成（原地修改img），超出图片的部分被裁掉
+    # img 不是RGBA时，只把水印覆盖的区域转换为RGBA合成后再粘贴回去；
+    # source 为原始图片，用于在区域内保留原图的透明度信息
+    x, y = position
+    left, top = max(0, x), max(0, y)
+    right, bottom = min(img.width, x + layer.width), min(img.height, y + layer.height)
+    if right <= left or bottom <= top:
+        return img
+
+    source_box = (left - x, top - y, right - x, bottom - y)
+    with span("composite", mode=img.mode):
+        if img.mode == 'RGBA':
+            img.alpha_composite(layer, dest=(left, top), source=source_box)
+        else:
+            region = (source or img).crop((left, top, right, bottom)).convert('RGBA')
+            region.alpha_composite(layer, source=source_box)
+            img.paste(region.convert(img.mode), (left, top))
+    return img
+
+
+def has_alpha(img):
+    return img.mode in ('RGBA', 'LA', 'PA', 'RGBa', 'La') or 'transparency' in img.info
+
+
+def render_watermark(img, spec, mode='RGBA', copy=True):
+    # mode 为结果图像的模式：默认RGBA以保留透明度；
+    # 导出不带透明度的JPEG时传入RGB，避免整张图片在RGBA之间来回转换
+    # copy 为False时允许直接修改传入的图片，调用方不再需要原图时可以省去一次整图复制
+    source = img
+    with span("convert", mode=img.mode, target=mode):
+        if img.mode != mode:
+            img = img.convert(mode)
+        elif copy:
+            img = img.copy()
+        else:
+            img.load()
+
+    # 如果没有水印（文本为空或没有选择图片水印），直接返回原图
+    if spec.is_empty():
+        return img
+
+    layer, position = watermark_layer(spec, img.size)
+    if spec.tiled and img.mode == 'RGB' and (source is None or not has_alpha(source)):
+        # 平铺图层覆盖整张图片：不透明图片以图层自身的alpha为遮罩直接粘贴，只需遍历一次，
+        # 不必把整张图片转换为RGBA再转换回来（与alpha合成的差别在舍入误差以内）
+        with span("composite", mode=img.mode, tiled=True):
+            img.paste(layer, position, layer)
+        return img
+    return composite_layer(img, layer, position, source)
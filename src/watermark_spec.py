@@ -0,0 +1,66 @@
+from dataclasses import dataclass, replace
+
+
+@dataclass(frozen=True)
+class WatermarkSpec:
+    # 水印参数的不可变快照：可哈希、可pickle，可在子进程、命令行或缓存中使用
+    watermark_type: str = "text"  # text 或 image
+
+    # 文本水印
+    text: str = ""
+    font_family: str = "SimHei"
+    font_size: int = 24
+    bold: bool = False
+    font_color: str = "#000000"
+    transparency: int = 50  # 0-100
+    shadow_enabled: bool = False
+    shadow_distance: int = 2
+    stroke_enabled: bool = False
+    stroke_width: int = 1
+    stroke_color: str = "#FFFFFF"
+
+    # 图片水印
+    image_path: str = ""
+    image_size: tuple = (0, 0)
+    image_transparency: int = 50  # 0-100
+
+    # 水印左上角在图片中的相对位置，取值0~1，按图片宽高换算为像素坐标
+    anchor: tuple = (0.0, 0.0)
+
+    # 平铺水印：把旋转后的水印按网格重复铺满整张图片，网格经过 anchor 对应的位置
+    tiled: bool = False
+    tile_spacing: int = 100  # 相邻水印之间的间距（像素）
+    tile_angle: int = 30  # 逆时针旋转角度
+    tile_stagger: bool = True  # 隔行错开半个水印
+
+    def anchor_position(self, image_size):
+        img_width, img_height = image_size
+        return int(self.anchor[0] * img_width), int(self.anchor[1] * img_height)
+
+    def scaled(self, factor):
+        # 按比例缩放水印的几何尺寸（字号、描边宽度、阴影距离、图片水印大小、平铺间距），
+        # 用于在缩小的图片上渲染外观一致的水印；位置是相对坐标，不需要调整
+        if factor == 1:
+            return self
+
+        def scale(value):
+            return max(1, int(round(value * factor)))
+
+        image_width, image_height = self.image_size
+        return replace(
+            self,
+            font_size=scale(self.font_size),
+            stroke_width=scale(self.stroke_width),
+            shadow_distance=scale(self.shadow_distance),
+            image_size=(scale(image_width), scale(image_height)),
+            tile_spacing=int(round(self.tile_spacing * factor))
+        )
+
+    def is_empty(self):
+        if self.watermark_type == "text":
+            return not self.text
+        return not self.image_path
+
+
+def parse_color(color_code):
+    return (int(color_code[1:3], 16), int(color_code[3:5], 16), int(color_code[5:7], 16))
@@ -0,0 +1,144 @@
+import os
+import json
+from PIL import Image
+
+from watermark_spec import WatermarkSpec, parse_color
+from export_engine import ExportOptions
+
+
+# 模板文件（save_template 写出的JSON）与 WatermarkSpec / ExportOptions 之间的转换
+# 不依赖Qt，图形界面和命令行共用
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# 模板中以下拉框索引保存的选项
+OUTPUT_FORMATS = ["JPEG", "PNG"]
+RESIZE_METHODS = ["原始尺寸", "按宽度", "按高度", "按百分比"]
+IMAGE_RESIZE_METHODS = ["按百分比", "按宽度", "按高度"]
+
+# 旧模板只保存了预览窗口中的像素位置，按默认预览窗口大小换算
+DEFAULT_PREVIEW_SIZE = (800, 700)
+
+
+def image_watermark_size(source_size, resize_method, percent, width_text="", height_text=""):
+    # 根据选择的调整方式计算水印图片大小，输入无效时保持原始大小
+    source_width, source_height = source_size
+    new_width, new_height = source_width, source_height
+
+    if resize_method == "按百分比":
+        scale = percent / 100
+        new_width = int(source_width * scale)
+        new_height = int(source_height * scale)
+    elif resize_method == "按宽度" and width_text.strip():
+        try:
+            new_width = int(width_text)
+            # 保持宽高比
+            scale = new_width / source_width
+            new_height = int(source_height * scale)
+        except ValueError:
+            pass
+    elif resize_method == "按高度" and height_text.strip():
+        try:
+            new_height = int(height_text)
+            # 保持宽高比
+            scale = new_height / source_height
+            new_width = int(source_width * scale)
+        except ValueError:
+            pass
+
+    return new_width, new_height
+
+
+def resolve_template_path(name_or_path):
+    # 既可以传入模板文件路径，也可以传入模板目录中的模板名称
+    if os.path.isfile(name_or_path):
+        return name_or_path
+    return os.path.join(TEMPLATE_DIR, f"{name_or_path}.json")
+
+
+def load_template_file(name_or_path):
+    with open(resolve_template_path(name_or_path), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def template_anchor(template, watermark_type):
+    if 'anchor' in template:
+        return tuple(template['anchor'])
+
+    x, y = template.get('position', (100, 100))
+    preview_width, preview_height = DEFAULT_PREVIEW_SIZE
+    if watermark_type == "text":
+        return x / (preview_width - 20), y / (preview_height - 20)
+    return x / preview_width, y / preview_height
+
+
+def spec_from_template(template):
+    watermark_type = template.get('watermark_type', "text")
+
+    image_path = template.get('image_path', "") if watermark_type == "image" else ""
+    image_size = (0, 0)
+    if image_path:
+        with Image.open(image_path) as logo:
+            source_size = logo.size
+        resize_index = template.get('image_resize_method', 0)
+        image_size = image_watermark_size(
+            source_size,
+            IMAGE_RESIZE_METHODS[resize_index],
+            template.get('image_percent', 100),
+            template.get('image_width_input', ""),
+            template.get('image_height_input', "")
+        )
+
+    # 颜色在渲染时才解析，提前检查，避免每张图片都报同样的错误
+    for key in ('font_color', 'stroke_color'):
+        color = template.get(key)
+        if color is not None:
+            try:
+                parse_color(color)
+            except (TypeError, ValueError):
+                raise ValueError(f"无效的颜色 {key}: {color!r}") from None
+
+    return WatermarkSpec(
+        watermark_type=watermark_type,
+        text=template.get('text', "水印文字"),
+        font_size=int(template.get('font_size', "24")),
+        bold=template.get('bold', False),
+        font_color=template.get('font_color', "#000000"),
+        transparency=template.get('transparency', 50),
+        shadow_enabled=template.get('shadow_enabled', False),
+        shadow_distance=template.get('shadow_distance', 2),
+        stroke_enabled=template.get('stroke_enabled', False),
+        stroke_width=template.get('stroke_width', 1),
+        stroke_color=template.get('stroke_color', "#FFFFFF"),
+        image_path=image_path,
+        image_size=image_size,
+        image_transparency=template.get('image_transparency', 50),
+        anchor=template_anchor(template, watermark_type),
+        tiled=template.get('tiled', False),
+        tile_spacing=template.get('tile_spacing', 100),
+        tile_angle=template.get('tile_angle', 30),
+        tile_stagger=template.get('tile_stagger', True)
+    )
+
+
+def export_options_from_template(template, output_folder):
+    preserve_filename = template.get('preserve_filename', True)
+    prefix = template.get('prefix', "wm_")
+    suffix = template.get('suffix', "_watermarked")
+    # 与界面一致：仅在不保留原始文件名且前缀/后缀不为空时使用
+    use_prefix = not preserve_filename and prefix.strip() != ""
+    use_suffix = not preserve_filename and suffix.strip() != ""
+
+    return ExportOptions(
+        output_folder=output_folder,
+        output_format=OUTPUT_FORMATS[template.get('output_format', 0)],
+        quality=template.get('quality', 90),
+        resize_method=RESIZE_METHODS[template.get('resize_method', 0)],
+        width=template.get('width_input', ""),
+        height=template.get('height_input', ""),
+        percent=template.get('percent_value', 100),
+        preserve_filename=preserve_filename,
+        prefix=prefix if use_prefix else "",
+        suffix=suffix if use_suffix else "",
+        resize_first=template.get('resize_first', False)
+    )
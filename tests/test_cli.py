@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import contextlib
+from io import StringIO
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import cli
+
+
+class RunBatchTemplateErrorTest(unittest.TestCase):
+    # 模板内容无效时输出错误信息并返回2，不抛出异常
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.temp_dir, 'in')
+        os.makedirs(self.input_dir)
+        Image.new('RGB', (64, 48), 'white').save(os.path.join(self.input_dir, 'a.jpg'))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_batch(self, template):
+        template_path = os.path.join(self.temp_dir, 'template.json')
+        with open(template_path, 'w', encoding='utf-8') as f:
+            json.dump(template, f)
+        stderr = StringIO()
+        with contextlib.redirect_stderr(stderr), contextlib.redirect_stdout(StringIO()):
+            code = cli.main(['batch', self.input_dir, '-t', template_path,
+                             '-o', os.path.join(self.temp_dir, 'out'), '-j', '1'])
+        return code, stderr.getvalue()
+
+    def test_missing_watermark_image(self):
+        code, stderr = self.run_batch({'watermark_type': 'image',
+                                       'image_path': os.path.join(self.temp_dir, 'missing.png')})
+        self.assertEqual(code, 2)
+        self.assertIn('无效', stderr)
+
+    def test_malformed_color(self):
+        code, stderr = self.run_batch({'text': 'hi', 'font_color': 'red'})
+        self.assertEqual(code, 2)
+        self.assertIn('font_color', stderr)
+
+    def test_malformed_font_size(self):
+        code, _ = self.run_batch({'text': 'hi', 'font_size': 'large'})
+        self.assertEqual(code, 2)
+
+    def test_valid_template(self):
+        code, _ = self.run_batch({'text': 'hi', 'font_color': '#FF0000'})
+        self.assertEqual(code, 0)
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, 'out', 'a.jpg')))
+
+
+if __name__ == '__main__':
+    unittest.main()
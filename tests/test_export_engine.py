@@ -0,0 +1,46 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image, UnidentifiedImageError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from export_engine import ExportJob, ExportOptions, read_source, render_image
+from watermark_spec import WatermarkSpec
+
+
+class DecodeErrorTest(unittest.TestCase):
+    # 无法解码的源文件：错误信息中是源文件路径，而不是内存中的BytesIO对象
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.temp_dir, 'out')
+        self.broken_path = os.path.join(self.temp_dir, 'broken.jpg')
+        with open(self.broken_path, 'wb') as f:
+            f.write(b'not an image')
+        self.good_path = os.path.join(self.temp_dir, 'good.jpg')
+        Image.new('RGB', (64, 48), 'white').save(self.good_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_render_image_reports_source_path(self):
+        with self.assertRaises(UnidentifiedImageError) as context:
+            render_image(self.broken_path, read_source(self.broken_path), WatermarkSpec(text='hi'),
+                         ExportOptions(self.output_dir))
+        self.assertIn(self.broken_path, str(context.exception))
+        self.assertNotIn('BytesIO', str(context.exception))
+
+    def test_error_report_names_source_path(self):
+        job = ExportJob([self.good_path, self.broken_path], WatermarkSpec(text='hi'), ExportOptions(self.output_dir), 1)
+        list(job.run())
+        self.assertEqual(job.succeeded, 1)
+        self.assertEqual([source_path for source_path, _ in job.errors], [self.broken_path])
+        self.assertNotIn('BytesIO', job.error_report())
+
+
+if __name__ == '__main__':
+    unittest.main()
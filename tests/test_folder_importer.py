@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from PyQt5.QtWidgets import QApplication
+
+import main
+from folder_importer import FolderImporter
+from image_handle import ImageHandle
+
+
+class FolderImporterTest(unittest.TestCase):
+    # 文件头在后台线程中读取；无法打开的文件在扫描结束时一起报告
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.good_paths = []
+        for i in range(2):
+            path = os.path.join(self.folder, f'good{i}.jpg')
+            Image.new('RGB', (80, 60), 'white').save(path)
+            self.good_paths.append(path)
+        self.broken_paths = []
+        for i in range(3):
+            path = os.path.join(self.folder, f'broken{i}.jpg')
+            with open(path, 'wb') as f:
+                f.write(b'not an image')
+            self.broken_paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def wait_for(self, signal):
+        results = []
+        signal.connect(lambda *args: results.append(args))
+        deadline = time.monotonic() + 30
+        while not results and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.01)
+        self.assertEqual(len(results), 1)
+        return results[0]
+
+    def test_batches_carry_handles_read_off_the_gui_thread(self):
+        importer = FolderImporter()
+        batches = []
+        importer.batch_found.connect(batches.append)
+        gui_thread = threading.get_ident()
+        header_threads = set()
+        original_open = ImageHandle.open.__func__
+
+        def recording_open(cls, path):
+            header_threads.add(threading.get_ident())
+            return original_open(cls, path)
+
+        with mock.patch.object(ImageHandle, 'open', classmethod(recording_open)):
+            importer.start(self.folder)
+            cancelled, found, failures = self.wait_for(importer.finished)
+        importer.shutdown()
+
+        self.assertFalse(cancelled)
+        self.assertEqual(found, 5)
+        handles = [entry for batch in batches for entry in batch]
+        self.assertEqual(sorted(path for path, _ in handles), sorted(self.good_paths))
+        self.assertTrue(all(isinstance(handle, ImageHandle) for _, handle in handles))
+        self.assertEqual(sorted(path for path, _ in failures), sorted(self.broken_paths))
+        self.assertNotIn(gui_thread, header_threads)
+
+    def test_window_reports_failures_once(self):
+        window = main.WatermarkApp()
+        try:
+            with mock.patch.object(main.QMessageBox, 'exec_') as exec_, \
+                    mock.patch.object(main.QMessageBox, 'warning') as warning:
+                window.folder_importer.start(self.folder)
+                self.wait_for(window.folder_importer.finished)
+            self.assertEqual(len(window.images), 2)
+            self.assertEqual(exec_.call_count, 1)
+            self.assertEqual(warning.call_count, 0)
+        finally:
+            window.folder_importer.shutdown()
+            window.deleteLater()
+
+
+if __name__ == '__main__':
+    unittest.main()
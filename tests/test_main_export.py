@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from PyQt5.QtWidgets import QApplication, QPushButton
+
+import main
+
+
+class ExportImagesTest(unittest.TestCase):
+    # 通过主窗口导出：导出任务在后台运行，完成后报告结果
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.temp_dir, 'out')
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.temp_dir, f'img{i}.jpg')
+            Image.new('RGB', (160, 120), (40 * i, 80, 120)).save(path)
+            self.paths.append(path)
+        self.window = main.WatermarkApp()
+        self.window.add_images(self.paths)
+        self.window.output_folder_path = self.output_dir
+        self.window.workers_spin.setValue(1)
+
+    def tearDown(self):
+        self.window.export_runner.shutdown()
+        self.window.deleteLater()
+        shutil.rmtree(self.temp_dir)
+
+    def export_and_wait(self):
+        finished = []
+        self.window.export_runner.finished.connect(finished.append)
+        self.window.export_images()
+        # 导出在后台线程中进行，export_images 立即返回
+        self.assertTrue(self.window.export_runner.running)
+        deadline = time.monotonic() + 60
+        while not finished and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.01)
+        self.assertEqual(len(finished), 1)
+        return finished[0]
+
+    def test_completed_export_is_not_cancelled(self):
+        with mock.patch.object(main.QMessageBox, 'information') as information:
+            job = self.export_and_wait()
+        self.assertFalse(job.cancelled)
+        self.assertEqual(job.succeeded, len(self.paths))
+        self.assertEqual(information.call_args[0][1], "完成")
+        self.assertEqual(len(os.listdir(self.output_dir)), len(self.paths))
+        self.assertTrue(self.window.export_btn.isEnabled())
+        self.assertFalse(self.window.export_runner.running)
+
+    def test_second_export_is_ignored_while_running(self):
+        with mock.patch.object(main.QMessageBox, 'information') as information:
+            self.window.export_images()
+            job = self.window.export_runner.job
+            self.window.export_images()
+            self.assertIs(self.window.export_runner.job, job)
+            while self.window.export_runner.running:
+                self.app.processEvents()
+                time.sleep(0.01)
+        self.assertEqual(information.call_count, 1)
+
+    def test_invalid_font_size_shows_one_warning(self):
+        self.window.font_size.setEditText("")
+        with mock.patch.object(main.QMessageBox, 'warning') as warning:
+            self.window.export_images()
+        self.assertEqual(warning.call_count, 1)
+        self.assertFalse(self.window.export_runner.running)
+        self.assertTrue(self.window.export_btn.isEnabled())
+        self.assertFalse(os.path.exists(self.output_dir) and os.listdir(self.output_dir))
+
+    def test_cancel_reports_cancelled(self):
+        with mock.patch.object(main.QMessageBox, 'information') as information:
+            self.window.export_images()
+            # 与点击取消按钮相同
+            self.window.export_progress.findChild(QPushButton).click()
+            while self.window.export_runner.running:
+                self.app.processEvents()
+                time.sleep(0.01)
+        self.assertTrue(self.window.export_runner.job is None)
+        self.assertEqual(information.call_args[0][1], "已取消")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from PyQt5.QtCore import Qt, QPoint, QEvent
+from PyQt5.QtGui import QMouseEvent
+from PyQt5.QtWidgets import QApplication
+
+import main
+
+
+def mouse_event(event_type, pos, buttons=Qt.LeftButton):
+    button = Qt.NoButton if event_type == QEvent.MouseMove else Qt.LeftButton
+    return QMouseEvent(event_type, QPoint(*pos), button, buttons, Qt.NoModifier)
+
+
+class InvalidFontSizeTest(unittest.TestCase):
+    # 字体大小正在编辑（为空或不是数字）时，拖动水印和添加水印不会抛出异常
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        path = os.path.join(self.temp_dir, 'img.jpg')
+        Image.new('RGB', (320, 240), 'white').save(path)
+        self.window = main.WatermarkApp()
+        self.window.add_images([path])
+        self.window.font_size.setEditText("")
+
+    def tearDown(self):
+        self.window.deleteLater()
+        shutil.rmtree(self.temp_dir)
+
+    def test_drag_with_invalid_font_size(self):
+        self.window.on_preview_mouse_press(mouse_event(QEvent.MouseButtonPress, (100, 100)))
+        self.window.on_preview_mouse_move(mouse_event(QEvent.MouseMove, (120, 110)))
+        self.window.on_preview_mouse_release(mouse_event(QEvent.MouseButtonRelease, (120, 110), Qt.NoButton))
+        self.assertFalse(self.window.dragging)
+
+    def test_add_watermark_with_invalid_font_size(self):
+        img = Image.new('RGB', (64, 48), 'white')
+        result = self.window.add_watermark_to_image(img)
+        self.assertEqual(result.tobytes(), img.tobytes())
+        self.assertIsNot(result, img)
+
+
+if __name__ == '__main__':
+    unittest.main()
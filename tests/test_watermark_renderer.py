@@ -0,0 +1,91 @@
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image, ImageChops, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import watermark_renderer
+from watermark_spec import WatermarkSpec
+
+
+# 多级图像缩放结果与直接从原图缩放的最大允许差值（每通道，0-255）
+MIPMAP_MAX_ERROR = 4
+
+
+def line_logo(size):
+    # 细线条和圆环：缩小时最容易产生混叠的水印图片
+    logo = Image.new('RGBA', size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(logo)
+    width, height = size
+    for x in range(0, width, 37):
+        draw.line([(x, 0), (width - x, height)], fill=(200, 30, 30, 255), width=3)
+    draw.ellipse([width // 12, height // 6, width * 11 // 12, height * 5 // 6], outline=(20, 20, 220, 200), width=40)
+    return logo
+
+
+def noisy_logo(size):
+    # 2x2像素块的随机颜色和透明度
+    width, height = size
+    length = width // 2 * height // 2 * 4
+    data = random.Random(1).getrandbits(length * 8).to_bytes(length, 'little')
+    return Image.frombytes('RGBA', (width // 2, height // 2), data).resize(size, Image.NEAREST)
+
+
+def max_difference(layer, expected):
+    # 透明度通道和合成到不同背景上的结果中的最大差值；完全透明的像素颜色不影响结果
+    difference = ImageChops.difference(layer.getchannel('A'), expected.getchannel('A')).getextrema()[1]
+    for color in ((0, 0, 0, 255), (128, 128, 128, 255), (255, 255, 255, 255)):
+        background = Image.new('RGBA', layer.size, color)
+        composited = ImageChops.difference(Image.alpha_composite(background, layer),
+                                           Image.alpha_composite(background, expected))
+        difference = max(difference, max(high for _, high in composited.getextrema()))
+    return difference
+
+
+class MipmapParityTest(unittest.TestCase):
+    # 从多级图像缩放的水印与直接从原图缩放的结果相差不超过 MIPMAP_MAX_ERROR
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.logos = []
+        for name, logo in (('lines', line_logo((4096, 2048))), ('noisy', noisy_logo((4096, 2048)))):
+            path = os.path.join(cls.temp_dir, f'{name}.png')
+            logo.save(path)
+            cls.logos.append(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir)
+
+    def test_mipmap_matches_direct_resize(self):
+        for path in self.logos:
+            source_key = watermark_renderer.image_source_key(path)
+            levels = watermark_renderer.load_image_levels(source_key)
+            for size in ((100, 50), (150, 75), (179, 89), (256, 128), (120, 120)):
+                # 确认确实使用了缩小的级别
+                self.assertIsNot(watermark_renderer.mipmap_level(levels, size), levels[0])
+                for transparency in (0, 50):
+                    spec = WatermarkSpec(watermark_type='image', image_path=path, image_size=size,
+                                         image_transparency=transparency)
+                    layer = watermark_renderer._image_watermark_layer(source_key, spec)
+                    with mock.patch.object(watermark_renderer, 'mipmap_level', lambda levels, size: levels[0]):
+                        expected = watermark_renderer._image_watermark_layer(source_key, spec)
+                    with self.subTest(logo=os.path.basename(path), size=size, transparency=transparency):
+                        self.assertLessEqual(max_difference(layer, expected), MIPMAP_MAX_ERROR)
+
+    def test_small_reduction_uses_original(self):
+        # 缩小倍数不到 MIPMAP_GAP 时直接从原图缩放
+        levels = watermark_renderer.load_image_levels(watermark_renderer.image_source_key(self.logos[0]))
+        size = (4096 // watermark_renderer.MIPMAP_GAP + 1, 2048 // watermark_renderer.MIPMAP_GAP + 1)
+        self.assertIs(watermark_renderer.mipmap_level(levels, size), levels[0])
+
+
+if __name__ == '__main__':
+    unittest.main()